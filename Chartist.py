@@ -1,6 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import math
 
 class Chartist:
     """
@@ -20,6 +18,10 @@ class Chartist:
         The period over which the trader looks back to calculate demand.
     max_risk : float
         The maximum risk level tolerated by the trader.
+    rng : numpy.random.Generator
+        The source of the demand noise (the global NumPy generator if not given).
+    noise_sign : int
+        Sign applied to the demand noise; -1 gives the antithetic noise path.
     W : list
         The list of wealth values over time.
     G : list
@@ -28,7 +30,7 @@ class Chartist:
         The list of demand values over time.
     """
 
-    def __init__(self, node_number, eta, chi, sigma_c, lookback_period, max_risk):
+    def __init__(self, node_number, eta, chi, sigma_c, lookback_period, max_risk, rng=None, noise_sign=1):
         self.type = 'Chartist'
         self.node_number = node_number
         self.eta = eta
@@ -36,6 +38,8 @@ class Chartist:
         self.sigma_c = sigma_c
         self.lookback_period = lookback_period
         self.max_risk = max_risk
+        self.rng = np.random if rng is None else rng
+        self.noise_sign = noise_sign
         self.W = [0, 0]
         self.G = [0, 0]
         self.D = [0, 0]
@@ -86,9 +90,12 @@ class Chartist:
         # Calculate annualized volatility
         vol = np.std(np.diff(P_v)) * np.sqrt(252)
         
+        # Draw the noise every step so the noise stream stays aligned across runs
+        noise = self.noise_sign * self.rng.standard_normal()
+
         # If volatility is within the risk tolerance, update demand based on price change and random noise
         if vol <= self.max_risk:
-            self.D.append(self.chi * (P[t] - P[t-1]) + self.sigma_c * np.random.randn(1).item())
+            self.D.append(self.chi * (P[t] - P[t-1]) + self.sigma_c * noise)
         else:
             self.D.append(0)
         
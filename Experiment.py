@@ -1,15 +1,15 @@
-import streamlit as st
+import random
 from Network import Network
 from simulate_network import Market
+from cache import run_key
 from utils import progress_bar, clear_progress_bar
-import matplotlib.pyplot as plt
 import numpy as np
-import statsmodels.api as sm
-from statsmodels.graphics.tsaplots import plot_acf
-from statsmodels.stats.diagnostic import acorr_ljungbox
-from scipy.stats import kurtosis
-from scipy.stats import norm
-from tqdm import tqdm
+import analysis
+
+# Constructor arguments of Experiment, in order
+PARAMETER_NAMES = ('initial_price', 'time_steps', 'network_type', 'number_of_traders', 'percent_fund', 'percent_chartist',
+                   'percent_rational', 'percent_risky', 'high_lookback', 'low_lookback', 'high_risk', 'low_risk',
+                   'new_node_edges', 'connection_probability', 'mu', 'beta', 'alpha_w', 'alpha_O', 'alpha_p', 'seed', 'antithetic')
 
 class Experiment():
     """
@@ -35,9 +35,12 @@ class Experiment():
         alpha_w (float): Weight parameter.
         alpha_O (float): Offset parameter.
         alpha_p (float): Noise parameter.
+        seed (int): Seed of the random number generators, or None for a fresh random state.
+        antithetic (bool): Whether to use the antithetic demand noise of the seeded run.
+        cache (ResultCache): Cache of simulated prices and statistics of seeded runs, or None.
     """
 
-    def __init__(self, initial_price, time_steps, network_type='small_world', number_of_traders=150, percent_fund=0.5, percent_chartist=0.5, percent_rational=0.50, percent_risky=0.50, high_lookback=5, low_lookback=1, high_risk=0.50, low_risk=0.10, new_node_edges=5, connection_probability=0.5, mu=0.01, beta=1, alpha_w=2668, alpha_O=2.1, alpha_p=0):
+    def __init__(self, initial_price, time_steps, network_type='small_world', number_of_traders=150, percent_fund=0.5, percent_chartist=0.5, percent_rational=0.50, percent_risky=0.50, high_lookback=5, low_lookback=1, high_risk=0.50, low_risk=0.10, new_node_edges=5, connection_probability=0.5, mu=0.01, beta=1, alpha_w=2668, alpha_O=2.1, alpha_p=0, seed=None, antithetic=False, cache=None):
         self.initial_price = initial_price
         self.time_steps = time_steps
         self.network_type = network_type
@@ -57,16 +60,93 @@ class Experiment():
         self.alpha_w = alpha_w
         self.alpha_O = alpha_O
         self.alpha_p = alpha_p
+        self.seed = seed
+        self.antithetic = antithetic
+        self.cache = cache
+
+    def get_params(self):
+        """
+        Returns the constructor arguments of the experiment.
+
+        Returns:
+            dict: Parameter names and values, such that Experiment(**params) rebuilds the experiment.
+        """
+        return {name: getattr(self, name) for name in PARAMETER_NAMES}
+
+    def cache_key(self):
+        """
+        Returns the content address of the run in the result cache.
+
+        Returns:
+            str: Hash of all parameters, the seed and the engine version, or None for unseeded runs.
+        """
+        if self.seed is None:
+            return None
+        return run_key(self.get_params())
+
+    def simulate_prices(self, step_callback=None):
+        """
+        Returns the simulated prices, taking them from the result cache when possible.
+
+        Args:
+            step_callback (callable): Optional step callback of the simulation (see run_simulation).
+
+        Returns:
+            ndarray: The price series of the run.
+        """
+        key = self.cache_key() if self.cache is not None else None
+        if key is not None:
+            prices = self.cache.get_prices(key)
+            if prices is not None:
+                return prices
+        return np.array(self.run_simulation(step_callback=step_callback).prices)
+
+    def statistic(self, statistic, step_callback=None):
+        """
+        Evaluates a statistic of the run, taking it from the result cache when possible.
+
+        Args:
+            statistic (str or callable): Name in STATISTICS, or a function (experiment, prices) -> value.
+            step_callback (callable): Optional step callback of the simulation, if one is needed.
 
-    def run_simulation(self):
+        Returns:
+            The value of the statistic.
+        """
+        if isinstance(statistic, str):
+            name, function = statistic, STATISTICS[statistic]
+        else:
+            name, function = '{0}.{1}'.format(statistic.__module__, statistic.__qualname__), statistic
+
+        key = self.cache_key() if self.cache is not None else None
+        if key is not None:
+            value = self.cache.get_statistic(key, name)
+            if value is not None:
+                return value
+        value = function(self, self.simulate_prices(step_callback))
+        if key is not None:
+            self.cache.put_statistic(key, name, value)
+        return value
+
+    def run_simulation(self, step_callback=None, profiler=None):
         """
         Runs the market simulation.
 
+        Args:
+            step_callback (callable): Optional function called as step_callback(t, market) after every time step.
+            profiler (PhaseProfiler): Optional profiler, passed to Market.step as the timer of the phases of every time step (see profiler.py).
+
         Returns:
             Market: The market object containing the simulation results.
         """
+        # Seeding both generators makes the network draw reproducible; the seed also
+        # gives every trader its own demand noise stream (common random numbers)
+        if self.seed is not None:
+            random.seed(self.seed)
+            np.random.seed(self.seed)
+
         network = Network(network_type=self.network_type, number_of_traders=self.number_of_traders, percent_fund=self.percent_fund, percent_chartist=self.percent_chartist, percent_rational=self.percent_rational, percent_risky=self.percent_risky,
-                          high_lookback=self.high_lookback, low_lookback=self.low_lookback, high_risk=self.high_risk, low_risk=self.low_risk, new_node_edges=self.new_node_edges, connection_probability=self.connection_probability)
+                          high_lookback=self.high_lookback, low_lookback=self.low_lookback, high_risk=self.high_risk, low_risk=self.low_risk, new_node_edges=self.new_node_edges, connection_probability=self.connection_probability,
+                          noise_seed=self.seed, antithetic=self.antithetic)
         network.create_network()
         
         # Ensure enough initial prices for the first calculations
@@ -75,41 +155,35 @@ class Experiment():
                         alpha_w=self.alpha_w, alpha_O=self.alpha_O, alpha_p=self.alpha_p)
 
         for t in range(2, self.time_steps):
-            for agent in network.trader_dictionary.values():
-                agent.update_performance(market.prices, t)
-                agent.update_wealth(t)
+            market.step(t, timer=profiler)
+            if profiler is not None:
+                profiler.count_step(market, t)
 
-            # Update strategies for all agents
-            market.update_strategies(t)
-            # Calculate the demands of all agents
-            market.calculate_demands(t)
-            # Update price
-            market.update_price(t)
+            if step_callback is not None:
+                step_callback(t, market)
 
         clear_progress_bar()
+
+        key = self.cache_key() if self.cache is not None else None
+        if key is not None:
+            self.cache.put_prices(key, market.prices)
         return market
 
-    def analyze_autocorrelation_of_returns(self, prices):
+    def analyze_autocorrelation_of_returns(self, prices, plot=False):
         """
         Analyzes the autocorrelation of returns.
 
         Args:
             prices (list): List of prices from the simulation.
+            plot (bool): Whether to display the ACF in Streamlit.
 
         Returns:
             DataFrame: Ljung-Box test results.
         """
-        returns = np.diff(prices)
-        # Ljung-Box test
-        ljung_box_result = acorr_ljungbox(returns, lags=[20], return_df=True)
-        
-        plt.figure()
-        plot_acf(returns, lags=40)
-        plt.title('Autocorrelation Function (ACF) of Returns')
-        plt.xlabel('Lags')
-        plt.ylabel('Autocorrelation')
-        st.pyplot(plt.gcf())  # Display the figure in Streamlit
-        
+        ljung_box_result = analysis.ljung_box(prices, lags=[20])
+        if plot:
+            import plotting
+            plotting.show(plotting.acf_figure(prices, lags=40))
         return ljung_box_result
 
     def analyze_volatility_clustering(self, prices, plot=False):
@@ -123,85 +197,47 @@ class Experiment():
         Returns:
             tuple: Indicator of volatility clustering (1 or 0) and p-value of the ARCH test.
         """
-        prices = np.exp(np.array(prices))
-        returns = prices[1:] - prices[:-1]
-        # ARCH Test For Volatility Clustering
-        arch_test = sm.stats.diagnostic.het_arch(returns.flatten())
         if plot:
-            plt.figure()
-            plt.plot(returns**2)
-            plt.xlabel('Time')
-            plt.ylabel('Squared Returns')
-            st.pyplot(plt.gcf())
-        if arch_test[1] < 0.05:
-            return 1, arch_test[1]
-        else:
-            return 0, arch_test[1]
+            import plotting
+            plotting.show(plotting.squared_returns_figure(prices))
+        return analysis.arch_test(prices)
 
-    def crash_experiment(self):
+    def crash_experiment(self, prices=None):
         """
         Conducts the crash experiment to detect flash crashes.
 
+        Args:
+            prices (list): Prices of an already simulated run; if None a new run is simulated.
+
         Returns:
             tuple: Indicator of a crash (1 or 0) and the magnitude of the drop.
         """
-        market = self.run_simulation()
-        crash_indices = []
-        period = 30
-        drop_magnitude = 0
-        biggest_drop = None
-
-        # get the index of highest negative returns
-        indices = np.argsort(np.diff(market.prices))[0:30]
-        drop_lengths = []
-
-        for index in indices:
-            start_index = index
-            while (np.diff(market.prices)[start_index - 1] < 0) and start_index > 0:
-                start_index -= 1
-
-            end_index = start_index
-            counter = 1
-
-            if end_index == len(np.diff(market.prices)) - 1:
-                end_index = start_index
-            else:
-                while (np.diff(market.prices)[end_index + 1] < 0) and end_index < len(np.diff(market.prices)) - 3:
-                    end_index += 1
-
-            drop_lengths.append((start_index, end_index))
-
-            # calculate drop magnitude
-            if np.sum(np.diff(market.prices)[start_index:end_index+1]) < drop_magnitude:
-                drop_magnitude = np.sum(np.diff(market.prices)[start_index:end_index+1])
-                biggest_drop = (start_index, end_index)
-
-        if np.max(market.prices[end_index + 1: np.maximum(end_index+1+period, len(market.prices)-1)]) - market.prices[end_index+1] > np.sum(np.diff(market.prices)[start_index:end_index+1]) * 0.5 and np.sum(np.diff(market.prices)[start_index:end_index+1]) < -0.03:
-            print("Flash Crash Detected at time: ", index)
-            crash_indices.append((start_index, end_index))
-
-        drop_magnitude_list = []
-
-        if drop_magnitude <= -0.07:
-            return 1, drop_magnitude
-        else:
-            return 0, drop_magnitude
+        if prices is None:
+            prices = self.simulate_prices()
+        return analysis.detect_crash(prices)
 
     def multiple_runs_crash(self, n_runs):
         """
         Runs the crash experiment multiple times.
 
+        A seeded experiment gives run i the seed job_seed(seed, 0, i), so the runs are distinct but reproducible.
+
         Args:
             n_runs (int): Number of runs.
 
         Returns:
             tuple: Total number of crashes and list of drop magnitudes.
         """
+        from sweep import job_seed  # sweep imports this module
+
         crash_count = 0
         drop_magintude_list = []
 
         for i in range(n_runs):
-            crash, drop_magintude = self.crash_experiment()  # Crash returns either 0 or 1
+            run = self
+            if self.seed is not None:
+                run = Experiment(**dict(self.get_params(), seed=job_seed(self.seed, 0, i)), cache=self.cache)
+            crash, drop_magintude = run.crash_experiment()  # Crash returns either 0 or 1
             crash_count += crash
             drop_magintude_list.append(drop_magintude)
 
@@ -219,26 +255,143 @@ class Experiment():
         Returns:
             float: Kurtosis value of the returns.
         """
-        rr = np.array(prices[1:T+1]) - np.array(prices[0:T])
         if plot:
-            plt.figure()
-            sm.qqplot(rr.flatten(), line='s')  # 's' line fit standardizes the data to have the same scale
-            plt.title('QQ Plot')
-            plt.xlabel('Returns')
-            plt.ylabel('Frequency')
-            st.pyplot(plt.gcf())  # Display the figure in Streamlit
-            
-            plt.figure()
-            plt.hist(rr.flatten(), bins=50, density=True, alpha=0.8, color='b', edgecolor='black', linewidth=1.2)
-            # Fit a normal distribution to the data
-            mu, std = norm.fit(rr.flatten())
-            xmin, xmax = plt.xlim()
-            # Plot normal distribution curve
-            x = np.linspace(xmin, xmax, 100)
-            p = norm.pdf(x, mu, std)
-            plt.plot(x, p, 'k', linewidth=2)
-            st.pyplot(plt.gcf())  # Display the figure in Streamlit
+            import plotting
+            plotting.show(plotting.qq_figure(prices, T))
+            plotting.show(plotting.return_histogram_figure(prices, T))
 
         # Calculate kurtosis (K value)
-        kurtosis_value = kurtosis(rr.flatten())
-        return kurtosis_value
+        return analysis.return_kurtosis(prices, T)
+
+    def rolling_experiment(self, prices, window=250, stride=1, plot=False):
+        """
+        Computes kurtosis, volatility and autocorrelation of the returns over sliding windows.
+
+        Args:
+            prices (array): Prices of one run, or a matrix with one run per row.
+            window (int): Number of returns per window.
+            stride (int): Number of steps between consecutive windows.
+            plot (bool): Whether to plot the statistics under the price path.
+
+        Returns:
+            dict: The statistics per window and 't', the time step at the end of every window
+                (see analysis.rolling_stylized_facts).
+        """
+        if plot:
+            import plotting
+            plotting.show(plotting.rolling_figure(prices, window, stride))
+        return analysis.rolling_stylized_facts(prices, window, stride)
+
+    def stylized_facts(self, prices):
+        """
+        Computes the extended stylized facts of the returns.
+
+        Args:
+            prices (array): Prices of one run, or a matrix with one run per row.
+
+        Returns:
+            dict: Hill tail index, absolute-return autocorrelation and its decay exponent,
+                Hurst and DFA exponents, leverage effect and gain/loss asymmetry (see analysis.stylized_facts).
+        """
+        return analysis.stylized_facts(prices)
+
+
+def kurtosis_statistic(experiment, prices):
+    """
+    Kurtosis of the returns over the full run.
+    """
+    return experiment.fat_tail_experiment(experiment.time_steps, prices)
+
+
+def volatility_clustering_statistic(experiment, prices):
+    """
+    Indicator (1 or 0) of significant volatility clustering.
+    """
+    return experiment.analyze_volatility_clustering(prices)[0]
+
+
+def arch_p_value_statistic(experiment, prices):
+    """
+    p-value of the ARCH test for volatility clustering.
+    """
+    return experiment.analyze_volatility_clustering(prices)[1]
+
+
+def crash_statistic(experiment, prices):
+    """
+    Indicator (1 or 0) of a crash.
+    """
+    return experiment.crash_experiment(prices)[0]
+
+
+def drop_magnitude_statistic(experiment, prices):
+    """
+    Magnitude of the largest drop.
+    """
+    return experiment.crash_experiment(prices)[1]
+
+
+def hill_tail_index_statistic(experiment, prices):
+    """
+    Hill estimate of the tail index of the absolute returns.
+    """
+    return float(analysis.hill_tail_index(prices))
+
+
+def abs_acf_statistic(experiment, prices):
+    """
+    Lag 1 autocorrelation of the absolute returns.
+    """
+    return float(analysis.abs_return_acf(prices, 1)[0])
+
+
+def abs_acf_decay_statistic(experiment, prices):
+    """
+    Power-law decay exponent of the autocorrelation of the absolute returns.
+    """
+    return float(analysis.acf_decay_exponent(prices))
+
+
+def hurst_statistic(experiment, prices):
+    """
+    Hurst exponent of the returns (rescaled range).
+    """
+    return float(analysis.hurst_exponent(prices))
+
+
+def dfa_statistic(experiment, prices):
+    """
+    DFA scaling exponent of the returns.
+    """
+    return float(analysis.dfa_exponent(prices))
+
+
+def leverage_statistic(experiment, prices):
+    """
+    Mean leverage correlation over lags 1..10.
+    """
+    return float(analysis.leverage_effect(prices).mean())
+
+
+def gain_loss_asymmetry_statistic(experiment, prices):
+    """
+    Ratio of the largest gains to the largest losses.
+    """
+    return float(analysis.gain_loss_asymmetry(prices))
+
+
+# Statistics that can be requested by name
+STATISTICS = {
+    'kurtosis': kurtosis_statistic,
+    'volatility_clustering': volatility_clustering_statistic,
+    'arch_p_value': arch_p_value_statistic,
+    'crash': crash_statistic,
+    'drop_magnitude': drop_magnitude_statistic,
+    'hill_tail_index': hill_tail_index_statistic,
+    'abs_acf_1': abs_acf_statistic,
+    'abs_acf_decay': abs_acf_decay_statistic,
+    'hurst': hurst_statistic,
+    'dfa': dfa_statistic,
+    'leverage': leverage_statistic,
+    'gain_loss_asymmetry': gain_loss_asymmetry_statistic,
+}
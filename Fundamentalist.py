@@ -1,6 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import math
 
 class Fundamentalist:
     """
@@ -28,6 +26,10 @@ class Fundamentalist:
         The period over which the trader looks back to calculate demand.
     max_risk : float
         The maximum risk level tolerated by the trader.
+    rng : numpy.random.Generator
+        The source of the demand noise (the global NumPy generator if not given).
+    noise_sign : int
+        Sign applied to the demand noise; -1 gives the antithetic noise path.
     W : list
         The list of wealth values over time.
     G : list
@@ -36,7 +38,7 @@ class Fundamentalist:
         The list of demand values over time.
     """
 
-    def __init__(self, node_number, eta, alpha_w, alpha_O, alpha_p, phi, sigma_f, pstar, lookback_period, max_risk):
+    def __init__(self, node_number, eta, alpha_w, alpha_O, alpha_p, phi, sigma_f, pstar, lookback_period, max_risk, rng=None, noise_sign=1):
         self.type = 'Fundamentalist'
         self.node_number = node_number
         self.eta = eta
@@ -48,6 +50,8 @@ class Fundamentalist:
         self.pstar = pstar
         self.lookback_period = lookback_period
         self.max_risk = max_risk
+        self.rng = np.random if rng is None else rng
+        self.noise_sign = noise_sign
         self.W = [0, 0]
         self.G = [0, 0]
         self.D = [0, 0]
@@ -98,9 +102,12 @@ class Fundamentalist:
         # Calculate annualized volatility
         vol = np.std(np.diff(P_v)) * np.sqrt(252)
         
+        # Draw the noise every step so the noise stream stays aligned across runs
+        noise = self.noise_sign * self.rng.standard_normal()
+
         # If volatility is within the risk tolerance, update demand based on the difference from the fundamental value and random noise
         if vol <= self.max_risk:
-            self.D.append(self.phi * (self.pstar - P[t]) + self.sigma_f * np.random.randn(1).item())
+            self.D.append(self.phi * (self.pstar - P[t]) + self.sigma_f * noise)
         else:
             self.D.append(0)
         
@@ -1,6 +1,8 @@
 from Experiment import Experiment
+import numpy as np
 import matplotlib.pyplot as plt
-from tqdm import tqdm
+from sweep import iter_sweep, job_seed
+from price_archive import PriceArchive, kurtosis_of_rows
 
 # Initialize an Experiment object with specified parameters
 experiment = Experiment(
@@ -25,18 +27,36 @@ experiment = Experiment(
     alpha_p=0
 )
 
-# List to store kurtosis values
-ks = []
-
-# Run the experiment multiple times and store the kurtosis values
-for i in tqdm(range(500)):
-    market = experiment.run_simulation()
-    ks.append(experiment.fat_tail_experiment(500, market.prices))
-
-# Plot the histogram of kurtosis values
-plt.hist(ks, bins=50, density=True, alpha=0.8, color='b', edgecolor='black', linewidth=1.2)
-plt.title('Kurtosis Distribution')
-plt.xlabel('Kurtosis')
-plt.ylabel('Frequency')
-plt.savefig('kurtosis_distribution.jpeg')
-plt.show()
+# Number of simulated price paths
+n_runs = 500
+
+if __name__ == '__main__':
+    # Keep every price path on disk, so other statistics can be computed later without re-simulating
+    archive = PriceArchive('kurtosis_distribution_prices.bin', n_steps=experiment.time_steps + 1)
+    params = {name: value for name, value in experiment.get_params().items() if name != 'seed'}
+
+    # iter_sweep seeds replica r of the single sweep point with job_seed(0, 0, r)
+    seeds = [job_seed(0, 0, replica) for replica in range(n_runs)]
+
+    # The first archived row of every seed of this experiment; rows of re-runs and of other parameters are ignored
+    row_of_seed = {}
+    for index, info in enumerate(archive.row_info):
+        if info is not None and info.get('params') == params:
+            row_of_seed.setdefault(info['seed'], index)
+
+    # Only the replicas that are not archived yet are simulated
+    missing = [replica for replica, seed in enumerate(seeds) if seed not in row_of_seed]
+    for row in iter_sweep(experiment, {}, replications=n_runs, statistic=None, replicas=missing):
+        row_of_seed.setdefault(row['seed'], len(archive))
+        archive.append(row['value'], {'params': params, 'seed': row['seed']})
+
+    # Calculate the kurtosis of exactly one run per seed
+    ks = kurtosis_of_rows(np.asarray(archive.matrix()[[row_of_seed[seed] for seed in seeds]], dtype=float))
+
+    # Plot the histogram of kurtosis values
+    plt.hist(ks, bins=50, density=True, alpha=0.8, color='b', edgecolor='black', linewidth=1.2)
+    plt.title('Kurtosis Distribution')
+    plt.xlabel('Kurtosis')
+    plt.ylabel('Frequency')
+    plt.savefig('kurtosis_distribution.jpeg')
+    plt.show()
@@ -1,10 +1,83 @@
+import hashlib
 import random
-import networkx as nx
-import matplotlib.pyplot as plt
+from collections import OrderedDict
 from Fundamentalist import Fundamentalist
 from Chartist import Chartist
 import numpy as np
 
+# Layouts of recently drawn graphs, keyed by (graph hash, layout method)
+_LAYOUT_CACHE = OrderedDict()
+_LAYOUT_CACHE_SIZE = 16
+
+# Above this many nodes the 'auto' layout uses the fast spectral method instead of spring_layout
+SPRING_LAYOUT_MAX_NODES = 1000
+
+TYPE_COLORS = {'Fundamentalist': 'tab:blue', 'Chartist': 'tab:orange'}
+
+
+def graph_hash(graph):
+    """
+    SHA-256 of the nodes and edges of a graph, identifying it for the layout cache.
+    """
+    digest = hashlib.sha256()
+    digest.update(np.array(sorted(graph.nodes()), dtype=np.int64).tobytes())
+    digest.update(np.array(sorted(tuple(sorted(edge)) for edge in graph.edges()), dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def spectral_layout(graph, iterations=300, seed=0):
+    """
+    Fast layout from the degree-normalized eigenvectors of the graph (Koren, 2003).
+
+    The two leading non-trivial eigenvectors of the random-walk matrix are
+    found by power iteration using only edge-list operations, so the cost is
+    linear in the number of edges per iteration.
+
+    Parameters:
+    ----------
+    graph : networkx.Graph
+        The graph; nodes are labeled 0..n-1.
+    iterations : int
+        Maximum number of power iterations per coordinate.
+    seed : int
+        Seed of the random starting vectors.
+
+    Returns:
+    -------
+    dict
+        Node positions scaled to [-1, 1].
+    """
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+    degree = np.maximum(np.bincount(edges.ravel(), minlength=n), 1).astype(float)
+    rng = np.random.default_rng(seed)
+
+    def walk(x):
+        # Half of the lazy random walk (x + D^-1 A x)
+        neighbors = np.bincount(edges[:, 0], weights=x[edges[:, 1]], minlength=n) + np.bincount(edges[:, 1], weights=x[edges[:, 0]], minlength=n)
+        return 0.5 * (x + neighbors / degree)
+
+    basis = [np.ones(n) / np.sqrt(n)]
+    for _ in range(2):
+        x = rng.standard_normal(n)
+        for _ in range(iterations):
+            previous = x
+            # D-orthogonalize against the constant vector and the previous coordinates
+            for u in basis:
+                x = x - (x @ (degree * u)) / (u @ (degree * u)) * u
+            x = walk(x)
+            x /= np.linalg.norm(x)
+            if x @ previous > 1 - 1e-7:
+                break
+        basis.append(x)
+
+    positions = np.column_stack(basis[1:])
+    positions -= positions.mean(axis=0)
+    positions /= max(np.abs(positions).max(), 1e-12)
+    return {node: positions[i] for i, node in enumerate(nodes)}
+
 class Network:
     """
     A class to represent a network of traders.
@@ -35,20 +108,26 @@ class Network:
         The probability of connection between nodes (used for 'erdos_renyi' and 'small_world' networks).
     new_node_edges : int, optional
         Number of edges to attach from a new node to existing nodes (used for 'barabasi' network).
+    noise_seed : int, optional
+        Seed of the per-trader demand noise streams; if None the traders share the global NumPy generator.
+    antithetic : bool, optional
+        Whether the traders use the antithetic (sign-flipped) demand noise.
 
     Methods:
     -------
     create_network():
         Creates and returns a network of traders.
-    display_network():
-        Displays the network structure with additional information from trader_dict.
+    layout(method):
+        Returns the (cached) node positions.
+    display_network(layout, path, show):
+        Plots the network with the nodes colored by trader type.
     get_neighbors(node_number):
         Returns the neighbors of a node.
     create_traders():
         Creates and returns a list of trader objects.
     """
 
-    def __init__(self, network_type, number_of_traders, percent_fund, percent_chartist, percent_rational=0.50, percent_risky=0.50, high_lookback=5, low_lookback=1, high_risk=0.50, low_risk=0.10, new_node_edges=None, connection_probability=None):
+    def __init__(self, network_type, number_of_traders, percent_fund, percent_chartist, percent_rational=0.50, percent_risky=0.50, high_lookback=5, low_lookback=1, high_risk=0.50, low_risk=0.10, new_node_edges=None, connection_probability=None, noise_seed=None, antithetic=False):
         self.network_type = network_type
         self.number_of_traders = number_of_traders
         self.percent_fund = percent_fund
@@ -61,6 +140,8 @@ class Network:
         self.low_risk = low_risk
         self.connection_probability = connection_probability
         self.new_node_edges = new_node_edges
+        self.noise_seed = noise_seed
+        self.antithetic = antithetic
         self.network = None
         self.trader_dictionary = None
 
@@ -73,6 +154,9 @@ class Network:
         tuple
             The network and a dictionary of traders.
         """
+        # networkx is imported here so that importing the engine stays cheap
+        import networkx as nx
+
         # Create the network based on the specified type
         if self.network_type == "barabasi":
             self.network = nx.barabasi_albert_graph(n=self.number_of_traders, m=self.new_node_edges)
@@ -89,22 +173,90 @@ class Network:
         self.trader_dictionary = {trader.node_number: trader for trader in traders}
         return self.network, self.trader_dictionary
 
-    def display_network(self):
+    def layout(self, method='auto'):
         """
-        Plots the network structure with additional information from trader_dict.
+        Node positions of the network, cached per graph.
+
+        Parameters:
+        ----------
+        method : str
+            'spring', 'spectral' (fast, for large graphs) or 'auto', which uses
+            spring_layout up to SPRING_LAYOUT_MAX_NODES nodes.
+
+        Returns:
+        -------
+        dict
+            The position of every node.
+        """
+        import networkx as nx
+
+        if method == 'auto':
+            method = 'spring' if self.network.number_of_nodes() <= SPRING_LAYOUT_MAX_NODES else 'spectral'
+        key = (graph_hash(self.network), method)
+        if key in _LAYOUT_CACHE:
+            _LAYOUT_CACHE.move_to_end(key)
+            return _LAYOUT_CACHE[key]
+
+        if method == 'spring':
+            pos = nx.spring_layout(self.network, seed=0)
+        elif method == 'spectral':
+            pos = spectral_layout(self.network)
+        else:
+            raise ValueError("Unknown layout method {0!r}".format(method))
+        _LAYOUT_CACHE[key] = pos
+        if len(_LAYOUT_CACHE) > _LAYOUT_CACHE_SIZE:
+            _LAYOUT_CACHE.popitem(last=False)
+        return pos
+
+    def display_network(self, layout='auto', path=None, show=False, max_labels=200):
+        """
+        Plots the network structure, coloring the nodes by the current type of their trader.
+
+        Parameters:
+        ----------
+        layout : str
+            Layout method (see layout).
+        path : str, optional
+            File the figure is saved to.
+        show : bool
+            Whether to open the figure in a (blocking) window.
+        max_labels : int
+            Nodes are labeled with the initial of their trader type up to this many nodes.
+
+        Returns:
+        -------
+        Figure
+            The matplotlib figure.
         """
-        # Loop over the nodes and link them to a trader
-        for node in self.network.nodes():
-            if node in self.trader_dictionary:
-                self.network.nodes[node]['label'] = self.trader_dictionary[node].type[0]
-
-        # Drawing the network
-        pos = nx.spring_layout(self.network)  # Positions for all nodes
-        nx.draw_networkx_nodes(self.network, pos, node_color='lightblue')  # Nodes
-        nx.draw_networkx_edges(self.network, pos, edge_color='red')  # Edges
-        nx.draw_networkx_labels(self.network, pos, labels=nx.get_node_attributes(self.network, 'label'))  # Labels
-        
-        plt.show()
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        from matplotlib.lines import Line2D
+
+        pos = self.layout(layout)
+        nodes = list(self.network.nodes())
+        xy = np.array([pos[node] for node in nodes])
+        types = [self.trader_dictionary[node].type if node in self.trader_dictionary else None for node in nodes]
+        colors = [TYPE_COLORS.get(trader_type, 'lightgray') for trader_type in types]
+
+        fig, ax = plt.subplots(figsize=(8, 8))
+        # All edges are drawn as a single collection
+        segments = np.array([(pos[u], pos[v]) for u, v in self.network.edges()]).reshape(-1, 2, 2)
+        ax.add_collection(LineCollection(segments, colors='gray', linewidths=0.5, alpha=0.3, zorder=1))
+        size = 80 if len(nodes) <= max_labels else max(2, 4000 / len(nodes))
+        ax.scatter(xy[:, 0], xy[:, 1], c=colors, s=size, zorder=2)
+        if len(nodes) <= max_labels:
+            for (x, y), trader_type in zip(xy, types):
+                if trader_type is not None:
+                    ax.annotate(trader_type[0], (x, y), ha='center', va='center', fontsize=7, zorder=3)
+        ax.legend(handles=[Line2D([], [], marker='o', linestyle='', color=color, label=name) for name, color in TYPE_COLORS.items()], loc='upper right')
+        ax.set_axis_off()
+        ax.autoscale_view()
+
+        if path is not None:
+            fig.savefig(path, bbox_inches='tight')
+        if show:
+            plt.show()
+        return fig
 
     def get_neighbors(self, node_number):
         """
@@ -137,6 +289,13 @@ class Network:
         trader_types = ['fundamentalist'] * num_fund + ['chartist'] * num_chart
         traders = []
 
+        # Every node gets its own noise stream, so runs with the same noise seed share their noise node by node
+        if self.noise_seed is None:
+            streams = [None] * self.number_of_traders
+        else:
+            streams = [np.random.default_rng(seed) for seed in np.random.SeedSequence(self.noise_seed).spawn(self.number_of_traders)]
+        noise_sign = -1 if self.antithetic else 1
+
         # Generate the different fractions of traders
         Nc = 0
         Nf = 0 
@@ -154,7 +313,7 @@ class Network:
                 pstar = 0
                 lookback_period = self.high_lookback if Nf / num_fund < self.percent_rational else self.low_lookback
                 max_risk = self.high_risk if Nf / num_fund < self.percent_risky else self.low_risk
-                traders.append(Fundamentalist(i, eta, alpha_w, alpha_O, alpha_p, phi, sigma_f, pstar, lookback_period, max_risk))
+                traders.append(Fundamentalist(i, eta, alpha_w, alpha_O, alpha_p, phi, sigma_f, pstar, lookback_period, max_risk, streams[i], noise_sign))
             if trader_type == 'chartist':
                 Nc += 1
                 eta = 0.991
@@ -162,5 +321,5 @@ class Network:
                 sigma_c = 1.724
                 lookback_period = self.high_lookback if Nc / num_chart < self.percent_rational else self.low_lookback
                 max_risk = self.high_risk if Nc / num_fund < self.percent_risky else self.low_risk
-                traders.append(Chartist(i, eta, chi, sigma_c, lookback_period, max_risk))
+                traders.append(Chartist(i, eta, chi, sigma_c, lookback_period, max_risk, streams[i], noise_sign))
         return traders
@@ -1,10 +1,8 @@
 import numpy as np
-from SALib.sample import latin
-from SALib.analyze import pawn
-import matplotlib.pyplot as plt
 import multiprocessing as mp
-from tqdm import tqdm
-from scipy.stats import kstwobign
+from telemetry import WorkerMetrics, TelemetryAggregator, follow
+from sensitivity import pawn_analyze
+from cache import ResultCache
 from Experiment import *
 
 def model(params_chunk):
@@ -18,7 +16,10 @@ def model(params_chunk):
     list: List of results for each parameter set.
     """
     results = []
+    # Every finished sample is published, so the coordinator can follow the progress live
+    metrics = WorkerMetrics(metrics_directory, total=len(params_chunk))
     for params in params_chunk:
+        metrics.sample_started()
         number_of_traders = int(params[0])
         if (number_of_traders % 2) != 0:
             number_of_traders += 1  # Increment to make even if odd
@@ -42,11 +43,13 @@ def model(params_chunk):
             beta=1,
             alpha_w=2668,
             alpha_O=2.1,
-            alpha_p=0
+            alpha_p=0,
+            seed=int(params[7]),  # Sample index, so every sample is reproducible and cacheable
+            cache=cache
         )
-        market = exp.run_simulation()
-        y2 = exp.fat_tail_experiment(500, market.prices)
+        y2 = exp.statistic('kurtosis', step_callback=metrics)
         results.append(y2)
+        metrics.sample_finished()
     return results
 
 # Define the problem for sensitivity analysis
@@ -68,50 +71,67 @@ problem = {
     ]
 }
 
-# Generate Latin Hypercube samples
-N = 1000
-param_values = latin.sample(problem, N)
+# Simulations already run for identical parameters and seeds are taken from the cache
+cache = ResultCache()
 
-def parallel_model_evaluation(param_values, num_workers=8):
+# Workers publish their progress to this directory (see telemetry.py)
+metrics_directory = 'pawn_kurtosis_metrics'
+
+def parallel_model_evaluation(param_values, num_workers=8, metrics_port=None):
     """
     Evaluate the model in parallel.
 
     Parameters:
     param_values (array): Array of parameter sets.
     num_workers (int): Number of parallel workers.
+    metrics_port (int): Optional port serving live metrics on http://127.0.0.1:<port>/metrics.
 
     Returns:
     array: Concatenated results from all workers.
     """
-    chunks = np.array_split(param_values, num_workers)
+    # Append the sample index, which is used as the seed of the simulation
+    samples = np.column_stack([param_values, np.arange(len(param_values))])
+    chunks = np.array_split(samples, num_workers)
+    aggregator = TelemetryAggregator(metrics_directory, total=len(samples))
+    aggregator.reset()
+    if metrics_port is not None:
+        aggregator.serve(metrics_port)
     with mp.Pool(num_workers) as pool:
-        results = list(tqdm(pool.imap(model, chunks), total=num_workers))
+        results = follow(pool.map_async(model, chunks), aggregator)
     return np.concatenate(results)
 
 if __name__ == '__main__':
+    # Plotting and sampling are only needed by the main process, so spawned workers skip these imports
+    import matplotlib.pyplot as plt
+    from SALib.sample import latin
+
+    # Generate Latin Hypercube samples
+    N = 1000
+    param_values = latin.sample(problem, N, seed=0)  # Fixed seed, so re-runs reuse cached simulations
+
     # Number of workers for parallel processing
     num_workers = mp.cpu_count()
 
     # Run the model in parallel
     Y = parallel_model_evaluation(param_values, num_workers)
 
+    # Store the samples so an emulator can be trained on them later
+    np.savez('pawn_kurtosis_samples.npz', X=param_values, Y=Y)
+
     # Perform sensitivity analysis using PAWN method
     k = 15  # Number of bins
-    S = pawn.analyze(problem, param_values, Y, k)
+    alpha = 0.05  # significance level
+    S = pawn_analyze(problem, param_values, Y, k, alpha=alpha)
 
     # Extract PAWN sensitivity indices
     pawn_Si_mean = S['mean']
     pawn_Si_max = S['maximum']
 
-    # Compute the critical value for the KS test
-    alpha = 0.05  # significance level
-    num_samples = len(param_values)
-    critical_value = 1.36 / np.sqrt(num_samples)
+    # Critical value of the two-sample KS test between a conditional and the full sample
+    critical_value = S['critical_value']
 
     # Verify KS Statistics
-    significant = {}
-    for name, si_max in zip(problem['names'], pawn_Si_max):
-        significant[name] = si_max > critical_value
+    significant = dict(zip(problem['names'], S['significant']))
 
     # Rank Factors
     factors = problem['names']
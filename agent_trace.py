@@ -0,0 +1,183 @@
+import glob
+import os
+import queue
+import threading
+
+import numpy as np
+
+# Integer codes of the trader types in traces
+TYPE_CODES = {'Fundamentalist': 0, 'Chartist': 1}
+
+# Fields that can be traced, with the dtype they are stored as
+FIELDS = {
+    'type': np.int8,
+    'demand': np.float64,
+    'wealth': np.float64,
+    'performance': np.float64,
+    'switch': np.bool_,
+}
+
+
+class AgentTracer:
+    """
+    Sampled agent-level trace of a simulation, written in compressed chunks.
+
+    Pass the tracer as the step callback of Experiment.run_simulation. Every
+    stride time steps it records the chosen fields of the chosen agents into
+    a fixed-size buffer; full buffers are handed to a background thread that
+    writes them as compressed chunk-XXXXXX.npz files, so the simulation loop
+    never waits on disk and memory stays bounded by a few chunks.
+
+    Attributes:
+    ----------
+    directory : str
+        Directory the chunks are written to.
+    fields : tuple
+        Traced fields, out of 'type', 'demand', 'wealth', 'performance' and 'switch'.
+    stride : int
+        Number of time steps between samples.
+    agents : array
+        Node numbers of the traced agents (None traces all agents).
+    chunk_steps : int
+        Number of sampled time steps per chunk.
+    max_pending : int
+        Number of full chunks that may wait for the writer before the simulation blocks.
+
+    A directory that already holds chunks is refused unless overwrite is set,
+    in which case the old chunks are deleted, so read_trace never mixes runs.
+    """
+
+    def __init__(self, directory, fields=('type', 'demand', 'wealth', 'switch'), stride=1, agents=None, chunk_steps=256, max_pending=4, overwrite=False):
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError("Unknown trace fields: {0}".format(sorted(unknown)))
+        self.directory = directory
+        self.fields = tuple(fields)
+        self.stride = stride
+        self.agents = None if agents is None else np.asarray(agents, dtype=int)
+        self.chunk_steps = chunk_steps
+        os.makedirs(directory, exist_ok=True)
+        stale = glob.glob(os.path.join(directory, 'chunk-*.npz'))
+        if stale and not overwrite:
+            raise FileExistsError("{0} already holds a trace; pass overwrite=True to replace it".format(directory))
+        for path in stale:
+            os.remove(path)
+
+        self.buffer = None
+        self.times = np.empty(chunk_steps, dtype=np.int64)
+        self.filled = 0
+        self.chunk_index = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.writer = threading.Thread(target=self._write_chunks, daemon=True)
+        self.writer.start()
+
+    def _allocate(self, n_agents):
+        self.buffer = {field: np.empty((self.chunk_steps, n_agents), dtype=FIELDS[field]) for field in self.fields}
+
+    def __call__(self, t, market):
+        """
+        Record the state of the traced agents after time step t.
+        """
+        if t % self.stride:
+            return
+        trader_dictionary = market.network.trader_dictionary
+        if self.agents is None:
+            self.agents = np.array(sorted(trader_dictionary), dtype=int)
+        if self.buffer is None:
+            self._allocate(len(self.agents))
+
+        row = self.filled
+        self.times[row] = t
+        agents = [trader_dictionary[node] for node in self.agents]
+        if 'type' in self.buffer:
+            self.buffer['type'][row] = [TYPE_CODES[agent.type] for agent in agents]
+        if 'demand' in self.buffer:
+            self.buffer['demand'][row] = [agent.D[t] for agent in agents]
+        if 'wealth' in self.buffer:
+            self.buffer['wealth'][row] = [agent.W[t] for agent in agents]
+        if 'performance' in self.buffer:
+            self.buffer['performance'][row] = [agent.G[t] for agent in agents]
+        if 'switch' in self.buffer:
+            self.buffer['switch'][row] = np.isin(self.agents, market.switches)
+        self.filled += 1
+        if self.filled == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the buffered samples to the writer thread.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.filled == 0:
+            return
+        chunk = {field: values[:self.filled].copy() for field, values in self.buffer.items()}
+        chunk['time'] = self.times[:self.filled].copy()
+        chunk['agents'] = self.agents
+        self.queue.put((self.chunk_index, chunk))
+        self.chunk_index += 1
+        self.filled = 0
+
+    def _write_chunks(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            index, chunk = item
+            path = os.path.join(self.directory, 'chunk-{0:06d}.npz'.format(index))
+            try:
+                np.savez_compressed(path + '.tmp.npz', **chunk)
+                os.replace(path + '.tmp.npz', path)
+            except Exception as error:  # Reported by the next flush or close
+                self.error = error
+
+    def close(self):
+        """
+        Write the remaining samples and wait for the writer thread to finish.
+        """
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_trace(directory, fields=None):
+    """
+    Read a trace written by AgentTracer.
+
+    Parameters:
+    ----------
+    directory : str
+        Directory of the chunks.
+    fields : list, optional
+        Fields to read (default: all traced fields).
+
+    Returns:
+    -------
+    dict
+        'time' (sampled time steps), 'agents' (node numbers) and one
+        (steps x agents) array per field.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, 'chunk-*[0-9].npz')))
+    if not paths:
+        raise FileNotFoundError("No trace chunks in {0}".format(directory))
+    parts = {}
+    agents = None
+    for path in paths:
+        with np.load(path) as chunk:
+            agents = chunk['agents']
+            for name in chunk.files:
+                if name == 'agents' or (fields is not None and name not in fields and name != 'time'):
+                    continue
+                parts.setdefault(name, []).append(chunk[name])
+    trace = {name: np.concatenate(values) for name, values in parts.items()}
+    trace['agents'] = agents
+    return trace
@@ -0,0 +1,544 @@
+"""
+Compute-only analysis of simulated price series.
+
+Everything here returns plain numbers or arrays and depends only on NumPy;
+statsmodels is imported lazily by the tests that need it. Figures are built
+separately in plotting.py, so the analytics can run headless in batch jobs
+and worker processes.
+
+The batch_* functions compute the same tests for every row of an (R, T)
+price matrix at once, which is much faster than calling the single-series
+functions (and statsmodels) once per replica. The extended stylized facts
+(tail index, absolute-return autocorrelation, Hurst and DFA exponents,
+leverage, gain/loss asymmetry) work along the last axis, so they take a
+single series or a matrix of replicas alike.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def log_returns(prices):
+    """
+    Returns of a (log) price series.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series.
+
+    Returns:
+    -------
+    array
+        First differences of the prices.
+    """
+    return np.diff(np.asarray(prices, dtype=float))
+
+
+def return_kurtosis(prices, T=None):
+    """
+    Excess kurtosis of the returns over the first T steps.
+
+    Equivalent to scipy.stats.kurtosis (Fisher definition, biased estimator).
+
+    Parameters:
+    ----------
+    prices : array
+        Price series.
+    T : int, optional
+        Number of returns used (default: all).
+
+    Returns:
+    -------
+    float
+        The excess kurtosis.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if T is not None:
+        prices = prices[:T + 1]
+    returns = np.diff(prices)
+    centered = returns - returns.mean()
+    m2 = np.mean(centered**2)
+    m4 = np.mean(centered**4)
+    return m4 / m2**2 - 3
+
+
+def arch_test(prices, nlags=None, significance=0.05):
+    """
+    ARCH-LM test for volatility clustering on the returns of exp(prices).
+
+    Parameters:
+    ----------
+    prices : array
+        (Log) price series.
+    nlags : int, optional
+        Number of lags of the test (statsmodels default if None).
+    significance : float
+        Significance level of the clustering indicator.
+
+    Returns:
+    -------
+    tuple
+        Indicator of volatility clustering (1 or 0) and p-value of the test.
+    """
+    from statsmodels.stats.diagnostic import het_arch
+
+    levels = np.exp(np.asarray(prices, dtype=float))
+    returns = levels[1:] - levels[:-1]
+    p_value = het_arch(returns, nlags=nlags)[1]
+    return (1 if p_value < significance else 0), p_value
+
+
+def ljung_box(prices, lags=(20,)):
+    """
+    Ljung-Box test for autocorrelation of the returns.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series.
+    lags : sequence
+        Lags at which the test is evaluated.
+
+    Returns:
+    -------
+    DataFrame
+        Ljung-Box statistics and p-values.
+    """
+    from statsmodels.stats.diagnostic import acorr_ljungbox
+
+    return acorr_ljungbox(log_returns(prices), lags=list(lags), return_df=True)
+
+
+def batch_kurtosis(prices, T=None):
+    """
+    Excess kurtosis of the returns of every row of a price matrix.
+
+    Parameters:
+    ----------
+    prices : array
+        (R, T) matrix with one price series per row (a single series gives a scalar).
+    T : int, optional
+        Number of returns used (default: all).
+
+    Returns:
+    -------
+    array
+        The excess kurtosis of every row, as return_kurtosis.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if T is not None:
+        prices = prices[..., :T + 1]
+    returns = np.diff(prices, axis=-1)
+    centered = returns - returns.mean(axis=-1, keepdims=True)
+    m2 = np.mean(centered**2, axis=-1)
+    m4 = np.mean(centered**4, axis=-1)
+    return m4 / m2**2 - 3
+
+
+def batch_arch_test(prices, nlags=None):
+    """
+    ARCH-LM test on the returns of exp(prices) for every row of a price matrix.
+
+    The squared returns of all rows are regressed on their own lags at once
+    by solving the stacked normal equations. The statistic and p-value match
+    statsmodels' het_arch (as used by arch_test).
+
+    Parameters:
+    ----------
+    prices : array
+        (R, T) matrix of (log) price series.
+    nlags : int, optional
+        Number of lags of the test (default: min(10, n // 5) for n returns, as statsmodels).
+
+    Returns:
+    -------
+    tuple
+        Arrays with the LM statistic and the p-value of every row.
+    """
+    from scipy.stats import chi2
+
+    levels = np.exp(np.atleast_2d(np.asarray(prices, dtype=float)))
+    squared = np.diff(levels, axis=1)**2
+    n = squared.shape[1]
+    if nlags is None:
+        nlags = min(10, n // 5)
+    # Rescaling every row leaves R^2 unchanged and keeps the normal equations well conditioned
+    squared = squared / squared.std(axis=1, keepdims=True)
+
+    # windows[:, t, j] is the squared return at t + j; the last column is the regressand
+    windows = sliding_window_view(squared, nlags + 1, axis=1)
+    nobs = windows.shape[1]
+    # Centering the regressors and the regressand accounts for the constant of the regression
+    centered = windows - windows.mean(axis=1, keepdims=True)
+    X = centered[:, :, :nlags]
+    y = centered[:, :, nlags]
+    XtX = np.einsum('rti,rtj->rij', X, X)
+    Xty = np.einsum('rti,rt->ri', X, y)
+    beta = np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+    total = np.einsum('rt,rt->r', y, y)
+    explained = np.einsum('ri,ri->r', beta, Xty)
+    lm = nobs * explained / total
+    return lm, chi2.sf(lm, nlags)
+
+
+def batch_ljung_box(prices, lags=(20,)):
+    """
+    Ljung-Box test for autocorrelation of the returns of every row of a price matrix.
+
+    The autocorrelations of all rows come from one FFT. The statistics and
+    p-values match statsmodels' acorr_ljungbox (as used by ljung_box).
+
+    Parameters:
+    ----------
+    prices : array
+        (R, T) matrix of price series.
+    lags : sequence
+        Lags at which the test is evaluated.
+
+    Returns:
+    -------
+    tuple
+        (R, len(lags)) arrays with the Ljung-Box statistics and p-values.
+    """
+    from scipy.stats import chi2
+
+    returns = np.diff(np.atleast_2d(np.asarray(prices, dtype=float)), axis=1)
+    n = returns.shape[1]
+    lags = np.asarray(lags, dtype=int)
+    max_lag = int(lags.max())
+    rho = autocorrelation(returns, max_lag)[:, 1:]
+    q = n * (n + 2) * np.cumsum(rho**2 / (n - np.arange(1, max_lag + 1)), axis=1)[:, lags - 1]
+    return q, chi2.sf(q, lags)
+
+
+def autocorrelation(x, max_lag):
+    """
+    Sample autocorrelation along the last axis, computed with an FFT.
+
+    Parameters:
+    ----------
+    x : array
+        Series, or an array of series along the last axis.
+    max_lag : int
+        Largest lag.
+
+    Returns:
+    -------
+    array
+        Autocorrelations at lags 0..max_lag (statsmodels' acf with the default biased estimator).
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    centered = x - x.mean(axis=-1, keepdims=True)
+    # Zero padding to at least 2n avoids the circular wrap-around of the FFT autocovariance
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    spectrum = np.fft.rfft(centered, size, axis=-1)
+    autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), size, axis=-1)[..., :max_lag + 1]
+    return autocovariance / autocovariance[..., :1]
+
+
+def _log_log_slope(x, y):
+    # Least-squares slope of log(y) on log(x) along the last axis; non-positive values are left out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_y = np.log(y)
+    valid = np.isfinite(log_y)
+    log_x = np.broadcast_to(np.log(np.asarray(x, dtype=float)), log_y.shape)
+    count = valid.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = np.where(valid, log_x, 0).sum(axis=-1) / count
+        mean_y = np.where(valid, log_y, 0).sum(axis=-1) / count
+        dx = np.where(valid, log_x - mean_x[..., None], 0)
+        dy = np.where(valid, log_y - mean_y[..., None], 0)
+        slope = (dx * dy).sum(axis=-1) / (dx**2).sum(axis=-1)
+    return np.where(count >= 2, slope, np.nan)
+
+
+def _scales(n, min_scale=8, n_scales=10):
+    # Log-spaced window sizes with at least four windows per series
+    return np.unique(np.geomspace(min_scale, max(n // 4, min_scale), n_scales).astype(int))
+
+
+def abs_return_acf(prices, max_lag=50):
+    """
+    Autocorrelation of the absolute returns (volatility clustering) at lags 1..max_lag.
+    """
+    return autocorrelation(np.abs(np.diff(np.asarray(prices, dtype=float), axis=-1)), max_lag)[..., 1:]
+
+
+def acf_decay_exponent(prices, max_lag=50):
+    """
+    Exponent beta of the power-law decay acf(k) ~ k^-beta of the absolute-return autocorrelation.
+
+    Fitted on a log-log scale over the lags with a positive autocorrelation;
+    slow decay (small beta) indicates long memory in the volatility.
+    """
+    acf = abs_return_acf(prices, max_lag)
+    return -_log_log_slope(np.arange(1, max_lag + 1), acf)
+
+
+def hill_tail_index(prices, tail_fraction=0.05):
+    """
+    Hill estimator of the tail index of the absolute returns.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series, or an array of series along the last axis.
+    tail_fraction : float
+        Fraction of the largest absolute returns used by the estimator.
+
+    Returns:
+    -------
+    float or array
+        The tail index alpha; empirical returns typically give alpha between 3 and 5.
+    """
+    magnitudes = np.abs(np.diff(np.asarray(prices, dtype=float), axis=-1))
+    n = magnitudes.shape[-1]
+    k = max(int(tail_fraction * n), 1)
+    # The k + 1 largest values in decreasing order
+    largest = -np.sort(-magnitudes, axis=-1)[..., :k + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 / np.mean(np.log(largest[..., :k]) - np.log(largest[..., k:k + 1]), axis=-1)
+
+
+def _windows(x, scale):
+    # Non-overlapping windows of the given length along the last axis
+    n_windows = x.shape[-1] // scale
+    return x[..., :n_windows * scale].reshape(x.shape[:-1] + (n_windows, scale))
+
+
+def hurst_exponent(prices, scales=None):
+    """
+    Hurst exponent of the returns from rescaled-range (R/S) analysis.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series, or an array of series along the last axis.
+    scales : sequence, optional
+        Window sizes (default: log-spaced from 8 to a quarter of the series).
+
+    Returns:
+    -------
+    float or array
+        The Hurst exponent; 0.5 for uncorrelated returns, above 0.5 for persistent ones.
+    """
+    returns = np.diff(np.asarray(prices, dtype=float), axis=-1)
+    scales = _scales(returns.shape[-1]) if scales is None else np.asarray(scales)
+    rescaled_ranges = []
+    for scale in scales:
+        windows = _windows(returns, scale)
+        profile = np.cumsum(windows - windows.mean(axis=-1, keepdims=True), axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (profile.max(axis=-1) - profile.min(axis=-1)) / windows.std(axis=-1)
+        rescaled_ranges.append(np.nanmean(ratio, axis=-1))
+    return _log_log_slope(scales, np.stack(rescaled_ranges, axis=-1))
+
+
+def dfa_exponent(prices, scales=None):
+    """
+    Scaling exponent of detrended fluctuation analysis (DFA-1) of the returns.
+
+    The integrated returns are split into windows, the least-squares line of
+    every window is removed in closed form and the root mean square of the
+    residuals F(s) is fitted as F(s) ~ s^alpha.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series, or an array of series along the last axis.
+    scales : sequence, optional
+        Window sizes (default: log-spaced from 8 to a quarter of the series).
+
+    Returns:
+    -------
+    float or array
+        The DFA exponent alpha; 0.5 for uncorrelated returns.
+    """
+    returns = np.diff(np.asarray(prices, dtype=float), axis=-1)
+    profile = np.cumsum(returns - returns.mean(axis=-1, keepdims=True), axis=-1)
+    scales = _scales(returns.shape[-1]) if scales is None else np.asarray(scales)
+    fluctuations = []
+    for scale in scales:
+        windows = _windows(profile, scale)
+        t = np.arange(scale) - (scale - 1) / 2
+        centered = windows - windows.mean(axis=-1, keepdims=True)
+        # Residual variance of the linear fit: var(y) - cov(t, y)^2 / var(t)
+        residual = np.mean(centered**2, axis=-1) - (centered @ t / scale)**2 / np.mean(t**2)
+        fluctuations.append(np.sqrt(np.mean(np.maximum(residual, 0), axis=-1)))
+    return _log_log_slope(scales, np.stack(fluctuations, axis=-1))
+
+
+def leverage_effect(prices, max_lag=10):
+    """
+    Leverage correlation corr(r_t, r_{t+k}^2) at lags 1..max_lag.
+
+    Negative values mean that falling prices are followed by higher volatility.
+    """
+    returns = np.diff(np.asarray(prices, dtype=float), axis=-1)
+    squared = returns**2
+    correlations = []
+    for k in range(1, max_lag + 1):
+        x = returns[..., :-k] - returns[..., :-k].mean(axis=-1, keepdims=True)
+        y = squared[..., k:] - squared[..., k:].mean(axis=-1, keepdims=True)
+        correlations.append(np.mean(x * y, axis=-1) / np.sqrt(np.mean(x**2, axis=-1) * np.mean(y**2, axis=-1)))
+    return np.stack(correlations, axis=-1)
+
+
+def gain_loss_asymmetry(prices, horizon=1, tail_fraction=0.05):
+    """
+    Ratio of the largest gains to the largest losses of horizon-step returns.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series, or an array of series along the last axis.
+    horizon : int
+        Number of steps over which the returns are taken.
+    tail_fraction : float
+        Fraction of the returns in each tail.
+
+    Returns:
+    -------
+    float or array
+        Mean of the largest gains over the mean magnitude of the largest
+        losses; below 1 when large drops are bigger than large rises.
+    """
+    prices = np.asarray(prices, dtype=float)
+    returns = np.sort(prices[..., horizon:] - prices[..., :-horizon], axis=-1)
+    k = max(int(tail_fraction * returns.shape[-1]), 1)
+    return returns[..., -k:].mean(axis=-1) / -returns[..., :k].mean(axis=-1)
+
+
+def stylized_facts(prices):
+    """
+    The extended stylized facts of a price series or of every row of a price matrix.
+
+    Returns:
+    -------
+    dict
+        'hill_tail_index', 'abs_acf_1' (lag 1 autocorrelation of the absolute
+        returns), 'abs_acf_decay', 'hurst', 'dfa', 'leverage' (mean of L(k)
+        over lags 1..10) and 'gain_loss_asymmetry'.
+    """
+    return {
+        'hill_tail_index': hill_tail_index(prices),
+        'abs_acf_1': abs_return_acf(prices, 1)[..., 0],
+        'abs_acf_decay': acf_decay_exponent(prices),
+        'hurst': hurst_exponent(prices),
+        'dfa': dfa_exponent(prices),
+        'leverage': leverage_effect(prices).mean(axis=-1),
+        'gain_loss_asymmetry': gain_loss_asymmetry(prices),
+    }
+
+
+def _window_sums(x, window, starts):
+    # Sums of x over the windows [start, start + window) along the last axis, from one cumulative sum
+    cumulative = np.concatenate([np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)], axis=-1)
+    return cumulative[..., starts + window] - cumulative[..., starts]
+
+
+def _rolling_autocorrelation(x, window, starts, mean, sum_squares):
+    # Lag 1 autocorrelation of every window (biased estimator, as autocorrelation), from cumulative sums
+    products = _window_sums(x[..., :-1] * x[..., 1:], window - 1, starts)
+    head = _window_sums(x[..., :-1], window - 1, starts)
+    tail = _window_sums(x[..., 1:], window - 1, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (products - mean * (head + tail) + (window - 1) * mean**2) / sum_squares
+
+
+def rolling_stylized_facts(prices, window=250, stride=1):
+    """
+    Kurtosis, volatility and autocorrelation of the returns over sliding windows.
+
+    Every statistic comes from cumulative sums of the powers and lagged
+    products of the returns, so the cost is O(T) whatever the window length.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series, or an array of series along the last axis.
+    window : int
+        Number of returns per window.
+    stride : int
+        Number of steps between the starts of consecutive windows.
+
+    Returns:
+    -------
+    dict
+        't': the index in prices of the last price of every window, so the
+        statistics can be plotted against the same time axis as the prices;
+        'volatility' (standard deviation of the returns), 'kurtosis' (excess,
+        as return_kurtosis), 'autocorrelation' (lag 1, of the returns) and
+        'abs_autocorrelation' (lag 1, of the absolute returns), with the
+        windows along the last axis.
+    """
+    returns = np.diff(np.asarray(prices, dtype=float), axis=-1)
+    n = returns.shape[-1]
+    if not 2 <= window <= n:
+        raise ValueError("The window must hold between 2 and {0} returns, got {1}".format(n, window))
+    starts = np.arange(0, n - window + 1, stride)
+    magnitudes = np.abs(returns)
+    # Moments about the overall mean keep the power sums small and the differences accurate
+    returns = returns - returns.mean(axis=-1, keepdims=True)
+    magnitudes = magnitudes - magnitudes.mean(axis=-1, keepdims=True)
+
+    s1, s2, s3, s4 = (_window_sums(returns**p, window, starts) for p in (1, 2, 3, 4))
+    mean = s1 / window
+    m2 = s2 / window - mean**2
+    m4 = s4 / window - 4 * mean * s3 / window + 6 * mean**2 * s2 / window - 3 * mean**4
+    abs_mean = _window_sums(magnitudes, window, starts) / window
+    abs_m2 = _window_sums(magnitudes**2, window, starts) / window - abs_mean**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kurtosis = m4 / m2**2 - 3
+    return {
+        't': starts + window,
+        'volatility': np.sqrt(np.maximum(m2, 0)),
+        'kurtosis': kurtosis,
+        'autocorrelation': _rolling_autocorrelation(returns, window, starts, mean, window * m2),
+        'abs_autocorrelation': _rolling_autocorrelation(magnitudes, window, starts, abs_mean, window * abs_m2),
+    }
+
+
+def detect_crash(prices, threshold=-0.07, n_largest=30):
+    """
+    Detects crashes as the largest cumulative run of consecutive price drops.
+
+    Starting from each of the n_largest most negative returns, the run of
+    consecutive negative returns around it is followed back and forth and its
+    total is the drop magnitude.
+
+    Parameters:
+    ----------
+    prices : array
+        Price series.
+    threshold : float
+        Drop magnitude at or below which the run counts as a crash.
+    n_largest : int
+        Number of most negative returns the drops are searched around.
+
+    Returns:
+    -------
+    tuple
+        Indicator of a crash (1 or 0) and the magnitude of the largest drop.
+    """
+    returns = log_returns(prices)
+    n = len(returns)
+    drop_magnitude = 0
+
+    for index in np.argsort(returns)[0:n_largest]:
+        start_index = index
+        while returns[start_index - 1] < 0 and start_index > 0:
+            start_index -= 1
+
+        end_index = start_index
+        if end_index != n - 1:
+            while returns[end_index + 1] < 0 and end_index < n - 3:
+                end_index += 1
+
+        drop = np.sum(returns[start_index:end_index + 1])
+        if drop < drop_magnitude:
+            drop_magnitude = drop
+
+    return (1 if drop_magnitude <= threshold else 0), drop_magnitude
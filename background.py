@@ -0,0 +1,166 @@
+"""
+Simulations in a background worker process.
+
+A BackgroundRun starts Experiment.run_simulation in a separate process and
+streams the prices back through the step callback, so an interactive front
+end stays responsive, can draw the run while it progresses and can cancel it:
+
+    run = BackgroundRun(params)
+    while run.poll() == 'running':
+        draw(run.prices, run.progress)
+    if run.status == 'done':
+        ...
+"""
+
+import multiprocessing as mp
+import queue
+import sys
+import threading
+import time
+import types
+
+
+# Serializes the swap of sys.modules['__main__'] while a worker is started, since
+# Streamlit runs every session in its own thread of the same process
+_MAIN_SWAP_LOCK = threading.Lock()
+
+
+class Cancelled(Exception):
+    """
+    Raised inside the worker to stop a cancelled simulation.
+    """
+
+
+class _Reporter:
+    """
+    Step callback sending the new prices to the parent at most every interval seconds.
+    """
+
+    def __init__(self, messages, cancel, time_steps, interval):
+        self.messages = messages
+        self.cancel = cancel
+        self.time_steps = time_steps
+        self.interval = interval
+        self.sent = 0
+        self.last_report = 0
+
+    def __call__(self, t, market):
+        if self.cancel.is_set():
+            raise Cancelled()
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.report(t + 1, market.prices)
+            self.last_report = now
+
+    def report(self, t, prices):
+        self.messages.put(('progress', t / self.time_steps, list(prices[self.sent:])))
+        self.sent = len(prices)
+
+
+def _worker(params, messages, cancel, interval):
+    # Imported in the worker, so the parent only pays for it when it simulates itself
+    from Experiment import Experiment
+    from cache import ResultCache
+
+    try:
+        experiment = Experiment(**params, cache=ResultCache())
+        reporter = _Reporter(messages, cancel, experiment.time_steps, interval)
+        market = experiment.run_simulation(step_callback=reporter)
+        reporter.report(experiment.time_steps, market.prices)
+        messages.put(('done',))
+    except Cancelled:
+        messages.put(('cancelled',))
+    except Exception as error:
+        messages.put(('error', '{0}: {1}'.format(type(error).__name__, error)))
+
+
+class BackgroundRun:
+    """
+    A simulation running in a worker process.
+
+    Completed runs of seeded experiments are stored in the default ResultCache,
+    so they can be read back with Experiment.simulate_prices.
+
+    Attributes:
+    ----------
+    params : dict
+        Experiment parameters.
+    status : str
+        'running', 'done', 'cancelled' or 'error'.
+    progress : float
+        Fraction of the time steps simulated so far.
+    prices : list
+        Prices received so far.
+    error : str
+        Description of the exception that stopped the worker, if any.
+    """
+
+    def __init__(self, params, interval=0.25):
+        self.params = dict(params)
+        self.status = 'running'
+        self.progress = 0.0
+        self.prices = []
+        self.error = None
+        context = mp.get_context('spawn')
+        self._messages = context.Queue()
+        self._cancel = context.Event()
+        self._process = context.Process(target=_worker, args=(self.params, self._messages, self._cancel, interval), daemon=True)
+        # A spawned child re-runs the caller's main module, which for a Streamlit
+        # app is the whole app script; the worker only needs this module
+        with _MAIN_SWAP_LOCK:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = types.ModuleType('__main__')
+            try:
+                self._process.start()
+            finally:
+                sys.modules['__main__'] = main
+
+    def poll(self, timeout=0):
+        """
+        Process the messages of the worker.
+
+        Parameters:
+        ----------
+        timeout : float
+            Seconds to wait for the first message.
+
+        Returns:
+        -------
+        str
+            The status of the run.
+        """
+        while self.status == 'running':
+            try:
+                message = self._messages.get(timeout=timeout) if timeout else self._messages.get_nowait()
+            except queue.Empty:
+                if not self._process.is_alive() and self._messages.empty():
+                    self.status = 'error'
+                    self.error = 'The worker exited with code {0}'.format(self._process.exitcode)
+                break
+            timeout = 0
+            if message[0] == 'progress':
+                self.progress = message[1]
+                self.prices.extend(message[2])
+            else:
+                self.status = message[0]
+                if self.status == 'error':
+                    self.error = message[1]
+        if self.status != 'running':
+            self._process.join(timeout=1)
+        return self.status
+
+    def cancel(self):
+        """
+        Ask the worker to stop; it does so after the current time step.
+        """
+        self._cancel.set()
+
+    def terminate(self):
+        """
+        Kill the worker immediately.
+        """
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+        if self.status == 'running':
+            self.status = 'cancelled'
@@ -0,0 +1,295 @@
+"""
+Throughput and memory benchmarks of the simulation engines.
+
+Every case of the grid (engine x number_of_traders x network_type x
+new_node_edges x time_steps) runs in a fresh process. The case records the
+set-up time (building the network and traders), the steps per second of
+the market loop and the peak resident memory of the process. The results
+are saved as JSON together with a description of the machine, and compare
+checks a new result file against a stored baseline:
+
+    python benchmark.py run --traders 100 1000 10000 --output baseline.json
+    ... change the engine ...
+    python benchmark.py run --traders 100 1000 10000 --output current.json
+    python benchmark.py compare baseline.json current.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from engines import ENGINES
+
+# Parameters of the benchmarked market that are not part of the grid
+BASE_PARAMS = {
+    'initial_price': 0,
+    'percent_fund': 0.5,
+    'percent_chartist': 0.5,
+    'percent_rational': 0.5,
+    'percent_risky': 0.5,
+    'high_lookback': 10,
+    'low_lookback': 1,
+    'high_risk': 0.5,
+    'low_risk': 0.1,
+    'connection_probability': 0.5,
+    'mu': 0.01,
+    'beta': 1,
+    'alpha_w': 2668,
+    'alpha_O': 2.1,
+    'alpha_p': 0,
+    'seed': 0,
+}
+
+CASE_KEYS = ('engine', 'number_of_traders', 'network_type', 'new_node_edges', 'time_steps')
+
+
+class _StepTimer:
+    """
+    Step callback recording the time of every step and stopping the run after max_seconds.
+    """
+
+    def __init__(self, max_seconds):
+        self.max_seconds = max_seconds
+        self.start = time.perf_counter()
+        self.first = None
+        self.last = None
+        self.steps = 0
+
+    def __call__(self, t, market):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.steps += 1
+        if self.max_seconds is not None and now - self.first > self.max_seconds:
+            raise _BudgetExceeded()
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _run_case(case):
+    from Experiment import Experiment
+
+    case, max_seconds, trace_memory = case
+    params = dict(BASE_PARAMS, **{name: case[name] for name in CASE_KEYS if name != 'engine'})
+    engine = ENGINES[case['engine']]
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    timer = _StepTimer(max_seconds)
+    truncated = False
+    try:
+        engine(Experiment(**params), step_callback=timer)
+    except _BudgetExceeded:
+        truncated = True
+    end = time.perf_counter()
+
+    result = dict(case)
+    result['setup_seconds'] = (timer.first if timer.first is not None else end) - timer.start
+    result['steps'] = timer.steps
+    result['steps_per_second'] = (timer.steps - 1) / (timer.last - timer.first) if timer.steps > 1 and timer.last > timer.first else None
+    result['trader_steps_per_second'] = result['steps_per_second'] * case['number_of_traders'] if result['steps_per_second'] else None
+    result['total_seconds'] = end - timer.start
+    result['truncated'] = truncated
+    result['peak_rss_mb'] = _peak_rss_mb()
+    if trace_memory:
+        result['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def benchmark_cases(engines, traders, network_types, new_node_edges, time_steps):
+    """
+    The grid of benchmark cases; combinations the network generators reject are skipped.
+    """
+    cases = []
+    for engine, n, network_type, edges, steps in itertools.product(engines, traders, network_types, new_node_edges, time_steps):
+        if edges >= n:
+            continue
+        cases.append({'engine': engine, 'number_of_traders': n, 'network_type': network_type, 'new_node_edges': edges, 'time_steps': steps})
+    return cases
+
+
+def run_benchmarks(cases, repeat=1, max_seconds=None, trace_memory=False, verbose=True):
+    """
+    Run every case in a fresh process.
+
+    Parameters:
+    ----------
+    cases : list
+        Cases as returned by benchmark_cases.
+    repeat : int
+        Number of runs per case; the fastest run is reported.
+    max_seconds : float, optional
+        Time budget of the market loop of a run; longer runs are stopped and marked truncated.
+    trace_memory : bool
+        Whether to also record the peak of the Python heap with tracemalloc (slows the runs down).
+    verbose : bool
+        Whether to print every result.
+
+    Returns:
+    -------
+    list
+        One result dict per case.
+    """
+    context = mp.get_context('spawn')
+    results = []
+    for case in cases:
+        runs = []
+        for _ in range(repeat):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(_run_case, ((case, max_seconds, trace_memory),)))
+        best = max(runs, key=lambda run: run['steps_per_second'] or 0)
+        best['repeats'] = [run['steps_per_second'] for run in runs]
+        results.append(best)
+        if verbose:
+            print(_format_result(best))
+    return results
+
+
+def _format_result(result):
+    rate = result['steps_per_second']
+    return "{engine:<8} N={number_of_traders:<8} {network_type:<12} m={new_node_edges:<3} T={time_steps:<7}".format(**result) + \
+        " setup {0:8.2f} s  {1:>10} steps/s  peak {2:8.1f} MB{3}".format(
+            result['setup_seconds'], '-' if rate is None else '{0:.1f}'.format(rate), result['peak_rss_mb'] or float('nan'),
+            '  (truncated)' if result['truncated'] else '')
+
+
+def machine_info():
+    """
+    Description of the machine and software the benchmarks ran on.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'git_commit': commit,
+    }
+
+
+def save_results(results, path, settings=None):
+    """
+    Save benchmark results with the machine description and run settings as JSON.
+    """
+    from simulate_network import ENGINE_VERSION
+
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'engine_version': ENGINE_VERSION,
+            'machine': machine_info(),
+            'settings': settings or {},
+            'results': results,
+        }, f, indent=2)
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compare two benchmark files case by case.
+
+    Parameters:
+    ----------
+    baseline : dict
+        Contents of the stored baseline file.
+    current : dict
+        Contents of the new result file.
+    threshold : float
+        Relative loss of throughput (or growth of peak memory) reported as a regression.
+
+    Returns:
+    -------
+    list
+        One row per case present in both files with the keys of the case,
+        the throughput and memory ratios (current / baseline) and a
+        'regression' flag.
+    """
+    def key(result):
+        return tuple(result[name] for name in CASE_KEYS)
+
+    stored = {key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        if key(result) not in stored:
+            continue
+        old = stored[key(result)]
+        speed = result['steps_per_second'] / old['steps_per_second'] if result['steps_per_second'] and old['steps_per_second'] else None
+        memory = result['peak_rss_mb'] / old['peak_rss_mb'] if result['peak_rss_mb'] and old['peak_rss_mb'] else None
+        regression = (speed is not None and speed < 1 - threshold) or (memory is not None and memory > 1 + threshold)
+        rows.append(dict({name: result[name] for name in CASE_KEYS}, speed_ratio=speed, memory_ratio=memory, regression=regression))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulation engines.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run the benchmark grid')
+    run.add_argument('--engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES))
+    run.add_argument('--traders', nargs='+', type=int, default=[100, 1000, 10000])
+    run.add_argument('--network-types', nargs='+', default=['barabasi', 'small_world'])
+    run.add_argument('--new-node-edges', nargs='+', type=int, default=[2, 8])
+    run.add_argument('--time-steps', nargs='+', type=int, default=[200])
+    run.add_argument('--repeat', type=int, default=1)
+    run.add_argument('--max-seconds', type=float, default=60, help='Time budget of the market loop per run')
+    run.add_argument('--tracemalloc', action='store_true', help='Also record the peak of the Python heap')
+    run.add_argument('--output', default='benchmark_results.json')
+
+    compare = commands.add_parser('compare', help='Compare results against a baseline')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        cases = benchmark_cases(args.engines, args.traders, args.network_types, args.new_node_edges, args.time_steps)
+        results = run_benchmarks(cases, args.repeat, args.max_seconds, args.tracemalloc)
+        save_results(results, args.output, {'repeat': args.repeat, 'max_seconds': args.max_seconds, 'tracemalloc': args.tracemalloc})
+        print("Saved {0} results to {1}".format(len(results), args.output))
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        # The commit is expected to differ; everything else describes the environment
+        if {**baseline['machine'], 'git_commit': None} != {**current['machine'], 'git_commit': None}:
+            print("Warning: the results were measured on different machines or software versions")
+        if baseline.get('settings', {}).get('tracemalloc') != current.get('settings', {}).get('tracemalloc'):
+            print("Warning: only one of the runs traced memory allocations, which slows the engine down")
+        rows = compare_results(baseline, current, args.threshold)
+        for row in rows:
+            print("{engine:<8} N={number_of_traders:<8} {network_type:<12} m={new_node_edges:<3} T={time_steps:<7}".format(**row) +
+                  " speed x{0}  memory x{1}{2}".format(
+                      '-' if row['speed_ratio'] is None else '{0:.2f}'.format(row['speed_ratio']),
+                      '-' if row['memory_ratio'] is None else '{0:.2f}'.format(row['memory_ratio']),
+                      '  REGRESSION' if row['regression'] else ''))
+        sys.exit(1 if any(row['regression'] for row in rows) else 0)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from simulate_network import ENGINE_VERSION
+
+
+def _canonical(value):
+    """
+    Canonical JSON-compatible form of a parameter value, so that e.g. 5, 5.0
+    and np.int64(5) hash identically.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return repr(float(value))
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(item) for item in value]
+    raise TypeError("Cannot hash parameter value {0!r}".format(value))
+
+
+def run_key(params):
+    """
+    Content address of a simulation run.
+
+    Parameters:
+    ----------
+    params : dict
+        All Experiment constructor arguments, including the seed.
+
+    Returns:
+    -------
+    str
+        SHA-256 hex digest of the canonical parameters and the engine version.
+    """
+    payload = json.dumps({'params': _canonical(params), 'engine_version': ENGINE_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    An on-disk cache of simulated price series and derived statistics.
+
+    Entries are addressed by run_key, so identical runs are only simulated
+    once across the Streamlit app, the sweeps and the sensitivity scripts.
+    Only seeded runs are cached, since unseeded runs are not reproducible.
+    Writes are atomic and every statistic has its own file, so several
+    worker processes can share a cache.
+
+    Attributes:
+    ----------
+    directory : str
+        Directory holding the cache entries.
+    max_bytes : int
+        Size limit of the cache; the least recently used entries are evicted beyond it.
+    rescan_every : int
+        Number of writes after which the size of the cache is measured again,
+        to account for the writes of other processes sharing it.
+    """
+
+    def __init__(self, directory='.abm_cache', max_bytes=2 * 1024**3, rescan_every=1000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_every = rescan_every
+        # Running estimate of the cache size; scanning the cache on every write would make sweeps quadratic
+        self._size = None
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _statistic_path(self, key, name):
+        # Statistic names can be arbitrary (e.g. module.function), so the file name uses their hash
+        return self._path(key, '.{0}.stat.json'.format(hashlib.sha256(name.encode()).hexdigest()[:16]))
+
+    def _write(self, path, write):
+        # Write to a temporary file first so concurrent readers never see partial entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                write(f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._written(size)
+
+    def _written(self, size):
+        self._writes += 1
+        if self._size is None or self._writes % self.rescan_every == 0:
+            self._size = sum(size for _, size, _ in self.entries())
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _touch(self, path):
+        # The modification time records the last use for the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def get_prices(self, key):
+        """
+        Cached price series of a run, or None.
+        """
+        path = self._path(key, '.npy')
+        try:
+            prices = np.load(path)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return prices
+
+    def put_prices(self, key, prices):
+        """
+        Store the price series of a run.
+        """
+        self._write(self._path(key, '.npy'), lambda f: np.save(f, np.asarray(prices, dtype=float)))
+
+    def get_statistic(self, key, name):
+        """
+        Cached value of a derived statistic of a run, or None.
+        """
+        path = self._statistic_path(key, name)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('name') != name:
+            return None
+        self._touch(path)
+        return entry['value']
+
+    def put_statistic(self, key, name, value):
+        """
+        Store a derived statistic of a run (any JSON-serializable value).
+
+        Every statistic is written to its own file, so workers storing
+        different statistics of the same run do not overwrite each other.
+        """
+        payload = json.dumps({'name': name, 'value': _canonical_result(value)}).encode()
+        self._write(self._statistic_path(key, name), lambda f: f.write(payload))
+
+    def entries(self):
+        """
+        All cache entries with their size and last use.
+
+        Returns:
+        -------
+        list
+            Tuples (last use, size in bytes, paths) with one tuple per run key.
+        """
+        entries = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                # The prices and statistics of a run share the file name prefix key + '.'
+                key = name.split('.')[0]
+                last_use, size, paths = entries.get(key, (0, 0, []))
+                entries[key] = (max(last_use, stat.st_mtime), size + stat.st_size, paths + [path])
+        return list(entries.values())
+
+    def evict(self, target_fraction=0.9):
+        """
+        Remove the least recently used entries until the cache fits in target_fraction * max_bytes.
+
+        Evicting below the limit leaves room for many writes before the next eviction.
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, paths in entries:
+            if total <= target_fraction * self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        """
+        Remove every entry of the cache.
+        """
+        for _, _, paths in self.entries():
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._size = 0
+
+
+def _canonical_result(value):
+    # Statistics are often NumPy scalars or tuples thereof
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical_result(item) for item in value]
+    return value
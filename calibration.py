@@ -0,0 +1,433 @@
+"""
+Calibration of the model to empirical returns by the method of simulated moments.
+
+A parameter vector theta is scored by the weighted distance
+
+    J(theta) = (m_sim(theta) - m_emp)' W (m_sim(theta) - m_emp)
+
+between the moments of the empirical returns m_emp (volatility, kurtosis,
+autocorrelation of the absolute returns, Hill tail index) and the moments
+averaged over R simulated replicas m_sim(theta). Replica r uses the same
+seed at every theta (common random numbers), so differences in J reflect
+the parameters rather than the noise and J is a deterministic function the
+optimizer can compare. W defaults to the inverse variances of the
+empirical moments from a moving-block bootstrap.
+
+The replicas of a whole batch of candidates are simulated in one worker
+pool and their moments computed at once with the batch analytics. Two
+search modes are available:
+
+- 'direct': differential evolution, every member of a generation is a
+  batch of simulations;
+- 'surrogate': a Gaussian process emulator of the moments is trained on a
+  Latin hypercube design and proposes the points to simulate next, which
+  needs far fewer full simulations.
+
+    target = Calibration.from_file('returns.csv', problem, base_params, n_replicas=8)
+    result = target.surrogate_search(n_initial=40, n_iterations=10)
+
+or from the command line:
+
+    python calibration.py returns.csv --column ret --mode surrogate --replicas 8
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+
+import numpy as np
+
+import analysis
+from Experiment import Experiment
+from sweep import job_seed
+
+# Parameters that the model only accepts as integers
+INTEGER_PARAMETERS = ('time_steps', 'number_of_traders', 'high_lookback', 'low_lookback', 'new_node_edges')
+
+# Parameters calibrated by default, with their search bounds
+DEFAULT_PROBLEM = {
+    'num_vars': 4,
+    'names': ['mu', 'percent_risky', 'high_risk', 'high_lookback'],
+    'bounds': [
+        [0.001, 0.1],  # mu
+        [0.05, 1.0],  # percent_risky
+        [0.05, 0.5],  # high_risk
+        [5, 30],  # high_lookback
+    ]
+}
+
+
+def _volatility(prices):
+    return np.std(np.diff(prices, axis=-1), axis=-1)
+
+
+def _abs_acf(lag):
+    def moment(prices):
+        return analysis.abs_return_acf(prices, lag)[..., lag - 1]
+    return moment
+
+
+# Moments matched by default; every function maps an (R, T) price matrix to one value per row
+DEFAULT_MOMENTS = {
+    'volatility': _volatility,
+    'kurtosis': analysis.batch_kurtosis,
+    'abs_acf_1': _abs_acf(1),
+    'abs_acf_5': _abs_acf(5),
+    'abs_acf_10': _abs_acf(10),
+    'hill_tail_index': analysis.hill_tail_index,
+}
+
+
+def load_returns(path, column=None, kind='returns'):
+    """
+    Load an empirical return series from a local file.
+
+    Parameters:
+    ----------
+    path : str
+        A CSV file with a header, a .npy file, or a whitespace-separated text file with one value per line.
+    column : str, optional
+        Column of a CSV file (default: 'returns' or 'return' if present, otherwise the last numeric column).
+    kind : str
+        'returns' for (log) returns, 'prices' for price levels (converted to log
+        returns) or 'log_prices' for log price levels (differenced).
+
+    Returns:
+    -------
+    array
+        The returns, with missing values dropped.
+    """
+    if path.endswith('.npy'):
+        values = np.load(path)
+    elif path.endswith('.csv'):
+        import pandas as pd
+
+        frame = pd.read_csv(path)
+        if column is None:
+            names = [name for name in frame.columns if str(name).lower() in ('returns', 'return')]
+            numeric = frame.select_dtypes('number').columns
+            if not names and not len(numeric):
+                raise ValueError("{0} has no numeric column".format(path))
+            column = names[0] if names else numeric[-1]
+        values = frame[column].to_numpy(dtype=float)
+    else:
+        values = np.loadtxt(path)
+    values = np.asarray(values, dtype=float).ravel()
+    values = values[np.isfinite(values)]
+    if kind == 'prices':
+        return np.diff(np.log(values))
+    if kind == 'log_prices':
+        return np.diff(values)
+    if kind != 'returns':
+        raise ValueError("Unknown kind {0!r}".format(kind))
+    return values
+
+
+def returns_to_prices(returns):
+    """
+    The (log) price path starting at 0 whose returns are the given returns, along the last axis.
+    """
+    returns = np.asarray(returns, dtype=float)
+    return np.concatenate([np.zeros(returns.shape[:-1] + (1,)), np.cumsum(returns, axis=-1)], axis=-1)
+
+
+def compute_moments(prices, moments=None):
+    """
+    Moments of every row of a price matrix.
+
+    Returns:
+    -------
+    array
+        Shape (R, K) for the K moments (the moments of a single series if prices is 1-D).
+    """
+    moments = moments or DEFAULT_MOMENTS
+    return np.stack([np.asarray(function(prices), dtype=float) for function in moments.values()], axis=-1)
+
+
+def bootstrap_weights(returns, moments=None, n_boot=200, block_length=50, seed=0):
+    """
+    Diagonal MSM weights: inverse variances of the empirical moments from a moving-block bootstrap.
+
+    Blocks keep the volatility clustering of the returns, which an i.i.d.
+    bootstrap would destroy.
+
+    Returns:
+    -------
+    array
+        One weight per moment (0 for moments that do not vary).
+    """
+    returns = np.asarray(returns, dtype=float)
+    n = len(returns)
+    block_length = min(block_length, n)
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n - block_length + 1, size=(n_boot, n_blocks))
+    index = (starts[:, :, None] + np.arange(block_length)).reshape(n_boot, -1)[:, :n]
+    variance = np.nanvar(compute_moments(returns_to_prices(returns[index]), moments), axis=0)
+    return np.where(variance > 0, 1 / np.where(variance > 0, variance, 1), 0)
+
+
+def _simulate(job):
+    params, cache = job
+    return Experiment(**params, cache=cache).simulate_prices()
+
+
+class Calibration:
+    """
+    Method of simulated moments for the parameters of a SALib-style problem.
+
+    Attributes:
+    ----------
+    target : array
+        Empirical moments, in the order of moments.
+    problem : dict
+        Names and bounds of the calibrated parameters.
+    base_params : dict
+        Experiment parameters that are not calibrated.
+    moments : dict
+        Moment functions (see DEFAULT_MOMENTS).
+    weights : array
+        Diagonal weights of the moment distance.
+    n_replicas : int
+        Simulated replicas per parameter vector.
+    seed : int
+        Root seed; replica r runs with job_seed(seed, 0, r) at every parameter vector.
+    n_workers : int
+        Number of worker processes (1 runs in-process).
+    cache : ResultCache, optional
+        Cache of simulated prices, so re-evaluated parameter vectors are not simulated again.
+    history : list
+        Every evaluated parameter vector with its mean moments and objective.
+    """
+
+    def __init__(self, target, problem=None, base_params=None, moments=None, weights=None, n_replicas=8, seed=0, n_workers=None, cache=None):
+        self.moments = moments or DEFAULT_MOMENTS
+        self.target = np.asarray(target, dtype=float)
+        self.problem = problem or DEFAULT_PROBLEM
+        self.base_params = dict(base_params or {})
+        self.weights = np.ones(len(self.moments)) if weights is None else np.asarray(weights, dtype=float)
+        self.n_replicas = n_replicas
+        self.seed = seed
+        self.n_workers = n_workers or mp.cpu_count()
+        self.cache = cache
+        self.history = []
+        self.n_simulations = 0
+        self.bounds = np.asarray(self.problem['bounds'], dtype=float)
+
+    @classmethod
+    def from_returns(cls, returns, problem=None, base_params=None, moments=None, weighting='bootstrap', **kwargs):
+        """
+        Calibration against a return series.
+
+        The simulations run for as many steps as there are returns unless
+        base_params sets time_steps. weighting is 'bootstrap' (inverse
+        bootstrap variances) or 'identity'.
+        """
+        moments = moments or DEFAULT_MOMENTS
+        returns = np.asarray(returns, dtype=float)
+        target = compute_moments(returns_to_prices(returns), moments)
+        weights = bootstrap_weights(returns, moments, seed=kwargs.get('seed', 0)) if weighting == 'bootstrap' else None
+        base_params = dict({'initial_price': 0, 'time_steps': len(returns)}, **(base_params or {}))
+        return cls(target, problem, base_params, moments, weights, **kwargs)
+
+    @classmethod
+    def from_file(cls, path, problem=None, base_params=None, column=None, kind='returns', **kwargs):
+        """
+        Calibration against the returns in a local file (see load_returns).
+        """
+        return cls.from_returns(load_returns(path, column, kind), problem, base_params, **kwargs)
+
+    def params(self, x):
+        """
+        Experiment parameters of a parameter vector (without the seed).
+        """
+        params = dict(self.base_params)
+        for name, value in zip(self.problem['names'], np.clip(x, self.bounds[:, 0], self.bounds[:, 1])):
+            params[name] = int(round(value)) if name in INTEGER_PARAMETERS else float(value)
+        if params.get('number_of_traders', 0) % 2:
+            params['number_of_traders'] += 1  # The traders are split evenly between the types
+        return params
+
+    def simulate_moments(self, X):
+        """
+        Moments of every replica of every parameter vector.
+
+        All replicas of the batch run in one worker pool; replica r uses the
+        same seed at every parameter vector.
+
+        Returns:
+        -------
+        array
+            Shape (n, R, K) for n parameter vectors.
+        """
+        X = np.atleast_2d(X)
+        seeds = [job_seed(self.seed, 0, r) for r in range(self.n_replicas)]
+        jobs = [(dict(self.params(x), seed=seed), self.cache) for x in X for seed in seeds]
+        if self.n_workers == 1 or len(jobs) == 1:
+            paths = [_simulate(job) for job in jobs]
+        else:
+            with mp.Pool(min(self.n_workers, len(jobs))) as pool:
+                paths = pool.map(_simulate, jobs)
+        self.n_simulations += len(jobs)
+        return compute_moments(np.array(paths, dtype=float), self.moments).reshape(len(X), self.n_replicas, -1)
+
+    def distance(self, moments):
+        """
+        Weighted moment distance of mean moments of shape (..., K); infinite if a moment is undefined.
+        """
+        difference = np.asarray(moments, dtype=float) - self.target
+        value = np.sum(self.weights * difference**2, axis=-1)
+        return np.where(np.isfinite(value), value, np.inf)
+
+    def objective(self, X):
+        """
+        MSM objective of every parameter vector of a batch, simulating all of them at once.
+        """
+        X = np.atleast_2d(X)
+        mean_moments = np.nanmean(self.simulate_moments(X), axis=1)
+        values = self.distance(mean_moments)
+        for x, m, value in zip(X, mean_moments, values):
+            self.history.append({'x': np.array(x), 'moments': m, 'objective': float(value)})
+        return values
+
+    def best(self):
+        """
+        The evaluated parameter vector with the smallest objective.
+
+        Returns:
+        -------
+        dict
+            'params' (Experiment parameters), 'x', 'objective', 'moments'
+            (simulated and target, by name) and the number of 'simulations' run.
+        """
+        best = min(self.history, key=lambda entry: entry['objective'])
+        return {
+            'params': self.params(best['x']),
+            'x': best['x'],
+            'objective': best['objective'],
+            'moments': {name: {'simulated': float(value), 'target': float(target)}
+                        for name, value, target in zip(self.moments, best['moments'], self.target)},
+            'simulations': self.n_simulations,
+        }
+
+    def search(self, maxiter=20, popsize=8, tol=1e-3):
+        """
+        Direct search by differential evolution; every generation is simulated as one batch.
+
+        Parameters:
+        ----------
+        maxiter : int
+            Maximum number of generations.
+        popsize : int
+            Population size multiplier (the population has popsize * D members).
+        tol : float
+            Relative convergence tolerance of the population objective.
+
+        Returns:
+        -------
+        dict
+            The best evaluated point (see best).
+        """
+        from scipy.optimize import differential_evolution
+
+        differential_evolution(lambda X: self.objective(X.T), self.bounds, maxiter=maxiter, popsize=popsize, tol=tol,
+                               polish=False, vectorized=True, updating='deferred', seed=self.seed)
+        return self.best()
+
+    def surrogate_search(self, n_initial=40, n_iterations=10, batch_size=None, n_candidates=20000, exploration=1.0):
+        """
+        Surrogate-assisted search with a Gaussian process emulator of the moments.
+
+        A Latin hypercube design is simulated first. In every iteration the
+        emulator is refitted on all simulated points and the batch_size
+        candidates with the smallest lower confidence bound of the objective
+        are simulated next, so simulations concentrate where the fit is good
+        or the emulator is still uncertain.
+
+        Parameters:
+        ----------
+        n_initial : int
+            Size of the initial design.
+        n_iterations : int
+            Number of refinement batches.
+        batch_size : int, optional
+            Points simulated per iteration (default: the number of workers).
+        n_candidates : int
+            Random candidates scored by the emulator per iteration.
+        exploration : float
+            Weight of the predictive uncertainty in the lower confidence bound.
+
+        Returns:
+        -------
+        dict
+            The best simulated point (see best).
+        """
+        from SALib.sample import latin
+        from emulator import Emulator
+
+        batch_size = batch_size or self.n_workers
+        names = list(self.moments)
+        self.objective(latin.sample(self.problem, n_initial, seed=self.seed))
+        rng = np.random.default_rng(self.seed)
+        for _ in range(n_iterations):
+            X = np.array([entry['x'] for entry in self.history])
+            Y = np.array([entry['moments'] for entry in self.history])
+            emulator = Emulator(self.problem, output_names=names, seed=int(rng.integers(2**31))).fit(X, Y)
+            candidates = latin.sample(self.problem, n_candidates, seed=int(rng.integers(2**31)))
+            mean, std = emulator.predict(candidates, return_std=True)
+            # Standard deviation of the distance from the linearization around the predicted moments
+            spread = 2 * np.sqrt(np.sum((self.weights * (mean - self.target) * std)**2, axis=1))
+            lower_bound = self.distance(mean) - exploration * spread
+            self.objective(candidates[np.argsort(lower_bound)[:batch_size]])
+        return self.best()
+
+
+def report(result):
+    """
+    Text report of a calibration result.
+    """
+    lines = ["objective {0:.4g} after {1} simulations".format(result['objective'], result['simulations'])]
+    lines.append("{0:<20} {1:>12}".format('parameter', 'value'))
+    for name, value in result['params'].items():
+        lines.append("{0:<20} {1:>12}".format(name, '{0:.4g}'.format(value) if isinstance(value, float) else value))
+    lines.append("")
+    lines.append("{0:<20} {1:>12} {2:>12}".format('moment', 'simulated', 'target'))
+    for name, values in result['moments'].items():
+        lines.append("{0:<20} {1:>12.4f} {2:>12.4f}".format(name, values['simulated'], values['target']))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    from cache import ResultCache
+
+    parser = argparse.ArgumentParser(description='Calibrate the model to empirical returns by the method of simulated moments.')
+    parser.add_argument('path', help='CSV, .npy or text file with the empirical series')
+    parser.add_argument('--column', default=None)
+    parser.add_argument('--kind', default='returns', choices=['returns', 'prices', 'log_prices'])
+    parser.add_argument('--mode', default='surrogate', choices=['surrogate', 'direct'])
+    parser.add_argument('--replicas', type=int, default=8)
+    parser.add_argument('--traders', type=int, default=150)
+    parser.add_argument('--network-type', default='barabasi')
+    parser.add_argument('--time-steps', type=int, default=None, help='Length of the simulated runs (default: the number of returns)')
+    parser.add_argument('--initial', type=int, default=40, help='Initial design of the surrogate mode')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--identity-weights', action='store_true')
+    parser.add_argument('--output', default=None, help='Save the result as JSON')
+    args = parser.parse_args()
+
+    base_params = {'network_type': args.network_type, 'number_of_traders': args.traders}
+    if args.time_steps is not None:
+        base_params['time_steps'] = args.time_steps
+    calibration = Calibration.from_file(args.path, DEFAULT_PROBLEM, base_params, args.column, args.kind,
+                                        weighting='identity' if args.identity_weights else 'bootstrap',
+                                        n_replicas=args.replicas, seed=args.seed, n_workers=args.workers, cache=ResultCache())
+    if args.mode == 'surrogate':
+        result = calibration.surrogate_search(args.initial, args.iterations)
+    else:
+        result = calibration.search(maxiter=args.iterations)
+    print(report(result))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(result, x=result['x'].tolist()), f, indent=2)
@@ -0,0 +1,154 @@
+"""
+Downsampling of long series for display.
+
+Charts only need a few thousand points, however long the simulation. These
+functions reduce a series to roughly that many points while keeping its
+visual shape:
+
+- lttb: Largest-Triangle-Three-Buckets, for line charts of prices.
+- min_max: the minimum and maximum of every bucket, which keeps every spike
+  (squared returns, drawdowns).
+- ohlc: open/high/low/close aggregates per bucket, for zoomed-out views.
+
+All functions return the indices of the kept points, so the x-axis stays the
+original time step.
+"""
+
+import numpy as np
+
+
+def _bucket_edges(n, n_buckets):
+    return np.linspace(0, n, n_buckets + 1).astype(np.int64)
+
+
+def lttb(y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept; of every bucket in between
+    the point spanning the largest triangle with the previously selected
+    point and the average of the next bucket is kept.
+
+    Parameters:
+    ----------
+    y : array
+        The series.
+    n_out : int
+        Number of points to keep (at least 3).
+
+    Returns:
+    -------
+    tuple
+        Indices (time steps) and values of the kept points.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n), y
+    # Buckets over the interior points y[1:n-1]
+    edges = 1 + _bucket_edges(n - 2, n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < n_out - 2:
+            next_x = (edges[bucket + 1] + edges[bucket + 2] - 1) / 2
+            next_y = y[edges[bucket + 1]:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = n - 1, y[-1]
+        x = np.arange(start, stop)
+        # Twice the triangle area; the factor does not change the argmax
+        area = np.abs((previous - next_x) * (y[start:stop] - y[previous]) - (previous - x) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        indices[bucket + 1] = previous
+    return indices, y[indices]
+
+
+def min_max(y, n_buckets):
+    """
+    Minimum and maximum of every bucket, in time order.
+
+    Parameters:
+    ----------
+    y : array
+        The series.
+    n_buckets : int
+        Number of buckets; at most 2 * n_buckets points are kept.
+
+    Returns:
+    -------
+    tuple
+        Indices (time steps) and values of the kept points.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n), y
+    edges = _bucket_edges(n, n_buckets)
+    starts = edges[:-1]
+    lows = np.minimum.reduceat(y, starts)
+    highs = np.maximum.reduceat(y, starts)
+    # Position of the extremes within their buckets
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    positions = np.arange(n)
+    low_index = np.full(n_buckets, n)
+    high_index = np.full(n_buckets, n)
+    np.minimum.at(low_index, bucket[y == lows[bucket]], positions[y == lows[bucket]])
+    np.minimum.at(high_index, bucket[y == highs[bucket]], positions[y == highs[bucket]])
+    indices = np.unique(np.concatenate([low_index, high_index]))
+    return indices, y[indices]
+
+
+def ohlc(y, n_buckets):
+    """
+    Open, high, low and close of every bucket.
+
+    Parameters:
+    ----------
+    y : array
+        The series.
+    n_buckets : int
+        Number of buckets.
+
+    Returns:
+    -------
+    dict
+        Arrays 'start' (first time step of the bucket), 'open', 'high', 'low' and 'close'.
+    """
+    y = np.asarray(y, dtype=float)
+    n_buckets = min(n_buckets, len(y))
+    edges = _bucket_edges(len(y), n_buckets)
+    starts = edges[:-1]
+    return {
+        'start': starts,
+        'open': y[starts],
+        'high': np.maximum.reduceat(y, starts),
+        'low': np.minimum.reduceat(y, starts),
+        'close': y[edges[1:] - 1],
+    }
+
+
+def for_display(y, max_points=2000, method='lttb'):
+    """
+    The series reduced to at most max_points points, or unchanged if it is short enough.
+
+    Parameters:
+    ----------
+    y : array
+        The series.
+    max_points : int
+        Maximum number of points to keep.
+    method : str
+        'lttb' or 'min_max'.
+
+    Returns:
+    -------
+    tuple
+        Indices (time steps) and values of the kept points.
+    """
+    if method == 'lttb':
+        return lttb(y, max_points)
+    if method == 'min_max':
+        return min_max(y, max_points // 2)
+    raise ValueError("Unknown downsampling method {0!r}".format(method))
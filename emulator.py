@@ -0,0 +1,329 @@
+"""
+Gaussian process emulator of simulation outputs.
+
+The emulator is trained on stored (parameters -> output) results such as the
+samples saved by the PAWN scripts, e.g.
+
+    data = np.load('pawn_kurtosis_samples.npz')
+    emulator = Emulator(problem, output_names=['kurtosis']).fit(data['X'], data['Y'])
+    print(emulator.cross_validate())
+    S = emulator.pawn(N=10**6)
+
+and can then answer sensitivity queries with millions of cheap evaluations
+and suggest which new simulations would be most informative.
+"""
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+from scipy.optimize import minimize
+from SALib.sample import latin
+
+from sensitivity import pawn_analyze
+
+
+class Emulator:
+    """
+    A Gaussian process surrogate for one or several simulation outputs.
+
+    Every output gets its own zero-mean GP with an anisotropic squared
+    exponential kernel on the inputs rescaled to the unit cube. The kernel
+    hyperparameters are fitted by maximizing the marginal likelihood.
+
+    Attributes:
+    ----------
+    problem : dict
+        The SALib problem definition (names and bounds of the inputs).
+    output_names : list
+        Names of the emulated outputs.
+    n_restarts : int
+        Number of random restarts of the hyperparameter optimization.
+    max_train : int
+        Maximum number of training samples (a random subset is used beyond it).
+    seed : int
+        Seed for the restarts, training subsets and candidate sampling.
+    """
+
+    def __init__(self, problem, output_names=None, n_restarts=2, max_train=2000, seed=None):
+        self.problem = problem
+        self.output_names = output_names
+        self.n_restarts = n_restarts
+        self.max_train = max_train
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        bounds = np.asarray(problem['bounds'], dtype=float)
+        self.lower = bounds[:, 0]
+        self.width = bounds[:, 1] - bounds[:, 0]
+        self.models = None
+
+    def _scale(self, X):
+        return (np.asarray(X, dtype=float) - self.lower) / self.width
+
+    @staticmethod
+    def _kernel(A, B, length_scales, signal_var):
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b on the length-scaled inputs never builds an (m, n, D) tensor
+        A = A / length_scales
+        B = B / length_scales
+        sq_dists = np.sum(A**2, axis=1)[:, None] + np.sum(B**2, axis=1)[None, :] - 2 * A @ B.T
+        return signal_var * np.exp(-0.5 * np.maximum(sq_dists, 0))
+
+    @staticmethod
+    def _negative_log_likelihood(theta, X, y, sq_dists):
+        """
+        Negative log marginal likelihood and its gradient for log hyperparameters
+        theta = (log length scales, log signal variance, log noise variance).
+        """
+        n, D = X.shape
+        length_scales = np.exp(theta[:D])
+        signal_var = np.exp(theta[D])
+        noise_var = np.exp(theta[D + 1])
+
+        scaled = sq_dists / length_scales[:, None, None]**2
+        K_f = signal_var * np.exp(-0.5 * scaled.sum(axis=0))
+        K = K_f + (noise_var + 1e-8) * np.eye(n)
+        try:
+            factor = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e25, np.zeros_like(theta)
+        alpha = cho_solve(factor, y)
+        nll = 0.5 * y @ alpha + np.sum(np.log(np.diag(factor[0]))) + 0.5 * n * np.log(2 * np.pi)
+
+        # d NLL / d theta = -0.5 tr((alpha alpha^T - K^-1) dK / d theta)
+        inner = np.outer(alpha, alpha) - cho_solve(factor, np.eye(n))
+        grad = np.empty_like(theta)
+        for d in range(D):
+            grad[d] = -0.5 * np.sum(inner * K_f * scaled[d])
+        grad[D] = -0.5 * np.sum(inner * K_f)
+        grad[D + 1] = -0.5 * noise_var * np.trace(inner)
+        return nll, grad
+
+    def _fit_output(self, X, y):
+        """
+        Fit the GP of a single (standardized) output.
+        """
+        n, D = X.shape
+        sq_dists = (X.T[:, :, None] - X.T[:, None, :])**2
+        starts = [np.concatenate([np.full(D, np.log(0.3)), [0.0, np.log(0.1)]])]
+        for _ in range(self.n_restarts):
+            starts.append(np.concatenate([self.rng.uniform(np.log(0.05), np.log(2.0), D),
+                                          [self.rng.uniform(-1, 1), self.rng.uniform(np.log(1e-3), 0)]]))
+        bounds = [(np.log(1e-3), np.log(1e2))] * D + [(np.log(1e-3), np.log(1e2)), (np.log(1e-6), np.log(10))]
+
+        best = None
+        for theta0 in starts:
+            result = minimize(self._negative_log_likelihood, theta0, args=(X, y, sq_dists), jac=True, method='L-BFGS-B', bounds=bounds)
+            if best is None or result.fun < best.fun:
+                best = result
+        return self._condition(X, y, best.x)
+
+    def _condition(self, X, y, theta):
+        """
+        Precompute the quantities needed for prediction given hyperparameters.
+        """
+        D = X.shape[1]
+        length_scales = np.exp(theta[:D])
+        signal_var = np.exp(theta[D])
+        noise_var = np.exp(theta[D + 1])
+        K = self._kernel(X, X, length_scales, signal_var) + (noise_var + 1e-8) * np.eye(len(X))
+        L = np.linalg.cholesky(K)
+        alpha = cho_solve((L, True), y)
+        return {'theta': theta, 'X': X, 'y': y, 'L': L, 'alpha': alpha,
+                'length_scales': length_scales, 'signal_var': signal_var, 'noise_var': noise_var}
+
+    def fit(self, X, Y):
+        """
+        Train the emulator on simulated results.
+
+        Parameters:
+        ----------
+        X : array
+            Simulation parameters of shape (n, D), in the units of the problem bounds.
+        Y : array
+            Simulation outputs of shape (n,) or (n, K).
+
+        Returns:
+        -------
+        Emulator
+            The fitted emulator.
+        """
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        if Y.ndim == 1:
+            Y = Y[:, None]
+        keep = np.all(np.isfinite(Y), axis=1)
+        X, Y = X[keep], Y[keep]
+        if len(X) > self.max_train:
+            subset = self.rng.choice(len(X), self.max_train, replace=False)
+            X, Y = X[subset], Y[subset]
+        if self.output_names is None:
+            self.output_names = ['y{0}'.format(k) for k in range(Y.shape[1])]
+
+        self.X_train = X
+        self.Y_train = Y
+        self.y_mean = Y.mean(axis=0)
+        self.y_std = Y.std(axis=0)
+        self.y_std[self.y_std == 0] = 1
+        Z = self._scale(X)
+        self.models = [self._fit_output(Z, (Y[:, k] - self.y_mean[k]) / self.y_std[k]) for k in range(Y.shape[1])]
+        return self
+
+    def predict(self, X, return_std=False, batch_size=20000):
+        """
+        Predict the outputs at new parameter values.
+
+        Parameters:
+        ----------
+        X : array
+            Parameter values of shape (m, D).
+        return_std : bool
+            Whether to also return the predictive standard deviation.
+        batch_size : int
+            Number of points predicted at once, to bound memory.
+
+        Returns:
+        -------
+        array or tuple
+            Predicted means of shape (m, K), and standard deviations if requested.
+        """
+        if self.models is None:
+            raise RuntimeError("The emulator has not been fitted")
+        Z = self._scale(np.atleast_2d(X))
+        mean = np.empty((len(Z), len(self.models)))
+        std = np.empty_like(mean)
+        for start in range(0, len(Z), batch_size):
+            block = Z[start:start + batch_size]
+            for k, model in enumerate(self.models):
+                K_s = self._kernel(block, model['X'], model['length_scales'], model['signal_var'])
+                mean[start:start + batch_size, k] = K_s @ model['alpha']
+                if return_std:
+                    v = solve_triangular(model['L'], K_s.T, lower=True)
+                    var = np.maximum(model['signal_var'] - np.sum(v**2, axis=0), 0)
+                    std[start:start + batch_size, k] = np.sqrt(var)
+        mean = mean * self.y_std + self.y_mean
+        if return_std:
+            return mean, std * self.y_std
+        return mean
+
+    def cross_validate(self, folds=5):
+        """
+        K-fold cross-validated prediction error, keeping the fitted hyperparameters.
+
+        Parameters:
+        ----------
+        folds : int
+            Number of folds.
+
+        Returns:
+        -------
+        dict
+            RMSE and R^2 of every output.
+        """
+        Z = self._scale(self.X_train)
+        Y = (self.Y_train - self.y_mean) / self.y_std
+        fold_of = self.rng.permutation(len(Z)) % folds
+        predictions = np.empty_like(Y)
+        for fold in range(folds):
+            train, test = fold_of != fold, fold_of == fold
+            for k, model in enumerate(self.models):
+                local = self._condition(Z[train], Y[train, k], model['theta'])
+                K_s = self._kernel(Z[test], local['X'], local['length_scales'], local['signal_var'])
+                predictions[test, k] = K_s @ local['alpha']
+
+        errors = (predictions - Y) * self.y_std
+        rmse = np.sqrt(np.mean(errors**2, axis=0))
+        r2 = 1 - np.sum(errors**2, axis=0) / np.sum((self.Y_train - self.y_mean)**2, axis=0)
+        return {name: {'rmse': rmse[k], 'r2': r2[k]} for k, name in enumerate(self.output_names)}
+
+    def pawn(self, N=100000, S=10, seed=None, **kwargs):
+        """
+        PAWN sensitivity analysis of the emulated outputs.
+
+        Parameters:
+        ----------
+        N : int
+            Number of Latin hypercube samples evaluated on the emulator.
+        S : int
+            Number of conditioning intervals.
+        seed : int, optional
+            Seed of the Latin hypercube sample.
+        **kwargs
+            Passed on to sensitivity.pawn_analyze.
+
+        Returns:
+        -------
+        dict
+            PAWN indices with one row per output.
+        """
+        X = latin.sample(self.problem, N, seed=seed)
+        return pawn_analyze(self.problem, X, self.predict(X), S, **kwargs)
+
+    def sobol(self, N=2**14, calc_second_order=False, seed=None):
+        """
+        Sobol sensitivity indices of every emulated output.
+
+        Parameters:
+        ----------
+        N : int
+            Base sample size of the Saltelli scheme (a power of 2).
+        calc_second_order : bool
+            Whether to compute second order indices.
+        seed : int, optional
+            Seed of the Sobol sequence scrambling.
+
+        Returns:
+        -------
+        dict
+            The SALib Sobol result of every output, keyed by output name.
+        """
+        from SALib.sample import sobol as sobol_sample
+        from SALib.analyze import sobol
+
+        X = sobol_sample.sample(self.problem, N, calc_second_order=calc_second_order, seed=seed)
+        Y = self.predict(X)
+        return {name: sobol.analyze(self.problem, Y[:, k], calc_second_order=calc_second_order, seed=seed)
+                for k, name in enumerate(self.output_names)}
+
+    def suggest(self, n_points, n_candidates=5000, output=None):
+        """
+        Active learning: pick the parameter sets whose simulation is most informative.
+
+        Candidates are drawn by Latin hypercube sampling and chosen greedily by
+        largest predictive standard deviation (relative to the output scale).
+        After each pick the GP is conditioned on its predicted value, so the
+        batch spreads out over the uncertain regions.
+
+        Parameters:
+        ----------
+        n_points : int
+            Number of parameter sets to return.
+        n_candidates : int
+            Number of random candidates to choose from.
+        output : str, optional
+            Output whose uncertainty is reduced (default: the sum over all outputs).
+
+        Returns:
+        -------
+        array
+            Parameter sets of shape (n_points, D) to simulate next.
+        """
+        outputs = range(len(self.models)) if output is None else [self.output_names.index(output)]
+        candidates = latin.sample(self.problem, n_candidates, seed=int(self.rng.integers(2**31)))
+        Z = self._scale(candidates)
+        chosen = []
+        models = [self.models[k] for k in outputs]
+        for _ in range(n_points):
+            score = np.zeros(len(Z))
+            for model in models:
+                K_s = self._kernel(Z, model['X'], model['length_scales'], model['signal_var'])
+                v = solve_triangular(model['L'], K_s.T, lower=True)
+                score += np.maximum(model['signal_var'] - np.sum(v**2, axis=0), 0) / model['signal_var']
+            score[chosen] = -np.inf
+            best = int(np.argmax(score))
+            chosen.append(best)
+
+            # Condition on the predicted value ("kriging believer") to spread the batch
+            conditioned = []
+            for model in models:
+                predicted = self._kernel(Z[best:best + 1], model['X'], model['length_scales'], model['signal_var']) @ model['alpha']
+                conditioned.append(self._condition(np.vstack([model['X'], Z[best]]), np.append(model['y'], predicted), model['theta']))
+            models = conditioned
+        return candidates[chosen]
@@ -0,0 +1,43 @@
+"""
+Registry of simulation engines.
+
+An engine runs a configured Experiment and returns its price path. Tools
+that compare or time implementations of the model (benchmark.py) look
+engines up here by name, so a new implementation only has to be
+registered to be benchmarked against the existing ones.
+"""
+
+import numpy as np
+
+
+def run_object_engine(experiment, step_callback=None):
+    """
+    The reference engine: one Python object per trader (Experiment.run_simulation).
+
+    Parameters:
+    ----------
+    experiment : Experiment
+        The configured experiment.
+    step_callback : callable, optional
+        Called as step_callback(t, market) after every time step.
+
+    Returns:
+    -------
+    array
+        The simulated prices.
+    """
+    return np.asarray(experiment.run_simulation(step_callback=step_callback).prices)
+
+
+ENGINES = {
+    'object': run_object_engine,
+}
+
+
+def get_engine(name):
+    """
+    The engine registered under a name.
+    """
+    if name not in ENGINES:
+        raise ValueError("Unknown engine {0!r}; available engines: {1}".format(name, ', '.join(sorted(ENGINES))))
+    return ENGINES[name]
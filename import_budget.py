@@ -0,0 +1,96 @@
+"""
+Import-time budget of the simulation core.
+
+The engine modules must import with NumPy as their only heavy dependency,
+because every spawned worker process imports them again. This script times
+each core module in a fresh interpreter, checks that none of the plotting,
+statistics or app libraries were pulled in, and times the start-up of a
+spawn-based worker pool. It exits with status 1 when a budget is exceeded.
+
+    python import_budget.py --workers 64
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import subprocess
+import sys
+import time
+
+CORE_MODULES = ['Experiment', 'simulate_network', 'Network', 'Chartist', 'Fundamentalist', 'analysis', 'cache', 'sweep', 'sensitivity']
+
+# Libraries that must only be imported lazily, when a figure, test or app actually needs them
+FORBIDDEN = ['matplotlib', 'scipy', 'statsmodels', 'streamlit', 'pandas', 'networkx', 'tqdm', 'SALib']
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': sorted({{name.split('.')[0] for name in sys.modules}})}}))
+"""
+
+
+def time_import(module):
+    """
+    Time the import of a module in a fresh interpreter.
+
+    Parameters:
+    ----------
+    module : str
+        Name of the module.
+
+    Returns:
+    -------
+    tuple
+        The import time in seconds and the forbidden libraries it loaded.
+    """
+    output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module)], check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['seconds'], [name for name in FORBIDDEN if name in result['loaded']]
+
+
+def _warm_up(_):
+    import Experiment  # noqa: F401
+    return True
+
+
+def time_worker_startup(n_workers):
+    """
+    Time until a spawn-based pool of n_workers has imported the engine in every worker.
+    """
+    start = time.perf_counter()
+    with mp.get_context('spawn').Pool(n_workers) as pool:
+        pool.map(_warm_up, range(n_workers), chunksize=1)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the import-time budget of the simulation core.')
+    parser.add_argument('--budget', type=float, default=0.5, help='Maximum import time of a core module in seconds')
+    parser.add_argument('--workers', type=int, default=8, help='Number of spawned workers (0 skips the pool check)')
+    parser.add_argument('--worker-budget', type=float, default=None, help='Maximum pool start-up time in seconds (default: 1 s plus 0.5 s per worker per CPU)')
+    args = parser.parse_args()
+
+    failed = False
+    for module in CORE_MODULES:
+        seconds, loaded = time_import(module)
+        status = 'ok'
+        if loaded:
+            status = 'loads ' + ', '.join(loaded)
+        elif seconds > args.budget:
+            status = 'over budget'
+        failed |= status != 'ok'
+        print("{0:<20} {1:7.3f} s  {2}".format(module, seconds, status))
+
+    if args.workers > 0:
+        worker_budget = args.worker_budget
+        if worker_budget is None:
+            # Workers start concurrently, one interpreter per CPU at a time
+            worker_budget = 1 + 0.5 * -(-args.workers // mp.cpu_count())
+        seconds = time_worker_startup(args.workers)
+        status = 'ok' if seconds <= worker_budget else 'over budget'
+        failed |= status != 'ok'
+        print("{0:<20} {1:7.3f} s  {2}".format('{0} spawned workers'.format(args.workers), seconds, status))
+
+    sys.exit(1 if failed else 0)
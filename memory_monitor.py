@@ -0,0 +1,225 @@
+"""
+Memory accounting for long simulations.
+
+MemoryMonitor is a step callback that every `interval` ticks records the
+resident set size of the process and, with tracemalloc, the live Python
+allocations attributed to the subsystem that made them:
+
+- network: the networkx graph and Network
+- agents: the per-trader histories (W, G, D) and trader objects
+- market: the price series and the Market/Experiment loop
+- analysis: analysis, plotting and archive code
+- other: everything else (imports, the interpreter)
+
+An allocation belongs to the innermost frame of its traceback that lies in
+one of these modules, so NumPy temporaries are charged to the code that
+asked for them. The report extrapolates the growth per tick, so a job can
+be sized before it is launched:
+
+    with MemoryMonitor(interval=100) as monitor:
+        experiment.run_simulation(step_callback=monitor)
+    print(monitor.report(time_steps=10**6))
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+# Module files (or package directories) per subsystem, checked from the innermost frame outwards
+SUBSYSTEMS = {
+    'network': ('Network.py', 'networkx'),
+    'agents': ('Chartist.py', 'Fundamentalist.py'),
+    'market': ('simulate_network.py', 'Experiment.py'),
+    'analysis': ('analysis.py', 'plotting.py', 'price_archive.py', 'downsample.py'),
+}
+
+
+def _subsystem_of(filename, cache={}):
+    if filename not in cache:
+        parts = filename.replace('\\', '/').split('/')
+        cache[filename] = next((name for name, modules in SUBSYSTEMS.items() if parts[-1] in modules or any(module in parts[:-1] for module in modules)), None)
+    return cache[filename]
+
+
+def rss_bytes():
+    """
+    Current resident set size of the process in bytes, or None if it cannot be read.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the peak is available here; ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def attribute_snapshot(snapshot):
+    """
+    Bytes of the live allocations of a tracemalloc snapshot per subsystem.
+    """
+    totals = dict.fromkeys(list(SUBSYSTEMS) + ['other'], 0)
+    for trace in snapshot.traces:
+        subsystem = None
+        # Frames run from the oldest to the most recent call
+        for frame in reversed(trace.traceback):
+            subsystem = _subsystem_of(frame.filename)
+            if subsystem is not None:
+                break
+        totals[subsystem or 'other'] += trace.size
+    return totals
+
+
+class MemoryMonitor:
+    """
+    Step callback sampling memory use every `interval` ticks.
+
+    Attributes:
+    ----------
+    interval : int
+        Number of ticks between samples.
+    trace : bool
+        Whether to attribute allocations with tracemalloc (slows the run down
+        and inflates the RSS with its own bookkeeping); without it only the
+        RSS is sampled.
+    nframes : int
+        Depth of the tracebacks stored by tracemalloc; deeper tracebacks
+        attribute more NumPy temporaries but slow tracing down further.
+    samples : list
+        Dicts with the tick 't', 'rss_bytes' and, when tracing, 'traced' (bytes per subsystem).
+    """
+
+    def __init__(self, interval=100, trace=True, nframes=5):
+        self.interval = interval
+        self.trace = trace
+        self.nframes = nframes
+        self.samples = []
+        self._started = False
+
+    def start(self):
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started = True
+        return self
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __call__(self, t, market):
+        if t % self.interval == 0:
+            self.sample(t)
+
+    def sample(self, t):
+        """
+        Record the memory use at tick t.
+        """
+        sample = {'t': t, 'rss_bytes': rss_bytes()}
+        if self.trace and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            sample['traced'] = attribute_snapshot(snapshot)
+            sample['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        self.samples.append(sample)
+        return sample
+
+    def growth(self):
+        """
+        Bytes per tick of the RSS and of every traced subsystem, from a linear fit over the samples.
+        """
+        if len(self.samples) < 2:
+            return {}
+        t = np.array([sample['t'] for sample in self.samples], dtype=float)
+        series = {}
+        if all(sample['rss_bytes'] is not None for sample in self.samples):
+            series['rss'] = [sample['rss_bytes'] for sample in self.samples]
+        if all('traced' in sample for sample in self.samples):
+            for name in self.samples[-1]['traced']:
+                series[name] = [sample['traced'][name] for sample in self.samples]
+        return {name: float(np.polyfit(t, np.array(values, dtype=float), 1)[0]) for name, values in series.items()}
+
+    def project(self, time_steps):
+        """
+        Projected bytes per subsystem (and RSS) after time_steps ticks, extrapolating the growth linearly.
+        """
+        last = self.samples[-1]
+        current = dict(last.get('traced', {}))
+        if last['rss_bytes'] is not None:
+            current['rss'] = last['rss_bytes']
+        return {name: current[name] + rate * (time_steps - last['t']) for name, rate in self.growth().items()}
+
+    def as_dict(self, time_steps=None):
+        """
+        Samples, growth rates and (for a target horizon) projections as a JSON-serializable dict.
+        """
+        result = {'samples': self.samples, 'bytes_per_tick': self.growth()}
+        if time_steps is not None and len(self.samples) >= 2:
+            result['projected_bytes'] = self.project(time_steps)
+        return result
+
+    def report(self, time_steps=None):
+        """
+        Text report of the last sample, the growth per 1000 ticks and, optionally, the projection to time_steps ticks.
+        """
+        if not self.samples:
+            return "No memory samples were taken"
+        last = self.samples[-1]
+        growth = self.growth()
+        projected = self.project(time_steps) if time_steps is not None and len(self.samples) >= 2 else {}
+        current = dict(last.get('traced', {}))
+        if last['rss_bytes'] is not None:
+            current['rss'] = last['rss_bytes']
+
+        header = "{0:<10} {1:>14} {2:>18}".format('subsystem', 'MB at t={0}'.format(last['t']), 'MB per 1000 ticks')
+        if projected:
+            header += " {0:>16}".format('MB at t={0}'.format(time_steps))
+        lines = [header]
+        for name, value in current.items():
+            line = "{0:<10} {1:>14.2f} {2:>18}".format(name, value / 2**20, '-' if name not in growth else '{0:.3f}'.format(1000 * growth[name] / 2**20))
+            if projected:
+                line += " {0:>16}".format('-' if name not in projected else '{0:.1f}'.format(projected[name] / 2**20))
+            lines.append(line)
+        if 'traced_peak_bytes' in last:
+            lines.append("")
+            lines.append("peak traced: {0:.2f} MB".format(last['traced_peak_bytes'] / 2**20))
+        return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    from Experiment import Experiment
+
+    parser = argparse.ArgumentParser(description='Measure the memory use of a simulation and project it to a longer horizon.')
+    parser.add_argument('--traders', type=int, default=150)
+    parser.add_argument('--network-type', default='barabasi')
+    parser.add_argument('--new-node-edges', type=int, default=5)
+    parser.add_argument('--time-steps', type=int, default=1000)
+    parser.add_argument('--interval', type=int, default=100)
+    parser.add_argument('--project', type=int, default=None, help='Horizon the memory use is projected to')
+    parser.add_argument('--no-trace', action='store_true', help='Only sample the RSS')
+    args = parser.parse_args()
+
+    experiment = Experiment(initial_price=0, time_steps=args.time_steps, network_type=args.network_type, number_of_traders=args.traders,
+                            new_node_edges=args.new_node_edges, seed=0)
+    with MemoryMonitor(args.interval, trace=not args.no_trace) as monitor:
+        market = experiment.run_simulation(step_callback=monitor)
+        monitor.sample(args.time_steps)
+    print(monitor.report(args.project))
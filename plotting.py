@@ -0,0 +1,152 @@
+"""
+Optional renderers for the analyses in analysis.py.
+
+matplotlib, statsmodels, scipy and streamlit are imported only when a figure
+is actually built or shown, so headless batch jobs never pay for them.
+Long series are downsampled (see downsample.py) to at most max_points
+points before they are drawn.
+"""
+
+import numpy as np
+
+from downsample import for_display, ohlc
+
+
+def acf_figure(prices, lags=40):
+    """
+    Autocorrelation function of the returns.
+    """
+    import matplotlib.pyplot as plt
+    from statsmodels.graphics.tsaplots import plot_acf
+
+    fig, ax = plt.subplots()
+    plot_acf(np.diff(np.asarray(prices, dtype=float)), lags=lags, ax=ax)
+    ax.set_title('Autocorrelation Function (ACF) of Returns')
+    ax.set_xlabel('Lags')
+    ax.set_ylabel('Autocorrelation')
+    return fig
+
+
+def squared_returns_figure(prices, max_points=4000):
+    """
+    Squared returns of exp(prices) over time; the extremes of every bucket are kept for long runs.
+    """
+    import matplotlib.pyplot as plt
+
+    levels = np.exp(np.asarray(prices, dtype=float))
+    returns = levels[1:] - levels[:-1]
+    fig, ax = plt.subplots()
+    ax.plot(*for_display(returns**2, max_points, method='min_max'))
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Squared Returns')
+    return fig
+
+
+def qq_figure(prices, T=None, max_points=4000):
+    """
+    QQ plot of the returns over the first T steps against a normal distribution.
+
+    Long runs are represented by max_points evenly spaced order statistics,
+    including the smallest and largest return.
+    """
+    import matplotlib.pyplot as plt
+    import statsmodels.api as sm
+
+    returns = np.diff(np.asarray(prices, dtype=float)[:None if T is None else T + 1])
+    if len(returns) > max_points:
+        returns = np.sort(returns)[np.linspace(0, len(returns) - 1, max_points).astype(int)]
+    fig, ax = plt.subplots()
+    sm.qqplot(returns, line='s', ax=ax)  # 's' line fit standardizes the data to have the same scale
+    ax.set_title('QQ Plot')
+    ax.set_xlabel('Returns')
+    ax.set_ylabel('Frequency')
+    return fig
+
+
+def return_histogram_figure(prices, T=None):
+    """
+    Histogram of the returns over the first T steps with a fitted normal density.
+    """
+    import matplotlib.pyplot as plt
+    from scipy.stats import norm
+
+    returns = np.diff(np.asarray(prices, dtype=float)[:None if T is None else T + 1])
+    fig, ax = plt.subplots()
+    ax.hist(returns, bins=50, density=True, alpha=0.8, color='b', edgecolor='black', linewidth=1.2)
+    # Fit a normal distribution to the data
+    mu, std = norm.fit(returns)
+    xmin, xmax = ax.get_xlim()
+    x = np.linspace(xmin, xmax, 100)
+    ax.plot(x, norm.pdf(x, mu, std), 'k', linewidth=2)
+    return fig
+
+
+def ohlc_figure(prices, n_buckets=500):
+    """
+    Zoomed-out view of a long price path: the high-low range of every bucket with its open and close ticks.
+    """
+    import matplotlib.pyplot as plt
+
+    bars = ohlc(prices, n_buckets)
+    width = np.diff(np.append(bars['start'], len(prices))).min()
+    middle = bars['start'] + width / 2
+    rising = bars['close'] >= bars['open']
+    fig, ax = plt.subplots()
+    for mask, color in ((rising, 'g'), (~rising, 'r')):
+        ax.vlines(middle[mask], bars['low'][mask], bars['high'][mask], color=color, linewidth=1)
+        ax.hlines(bars['open'][mask], middle[mask] - width / 2, middle[mask], color=color, linewidth=1)
+        ax.hlines(bars['close'][mask], middle[mask], middle[mask] + width / 2, color=color, linewidth=1)
+    ax.set_xlabel('Day')
+    ax.set_ylabel('Price')
+    return fig
+
+
+def rolling_figure(prices, window=250, stride=None, max_points=4000):
+    """
+    Price path above the rolling volatility, kurtosis and autocorrelations of its returns, on a shared time axis.
+
+    Without a stride, windows are spaced so at most max_points of them are drawn.
+    """
+    import matplotlib.pyplot as plt
+    from analysis import rolling_stylized_facts
+
+    prices = np.asarray(prices, dtype=float)
+    if stride is None:
+        stride = max(1, (len(prices) - 1 - window) // max_points + 1)
+    rolling = rolling_stylized_facts(prices, window, stride)
+    fig, axes = plt.subplots(4, 1, sharex=True, figsize=(8, 9))
+    axes[0].plot(*for_display(prices, max_points))
+    axes[0].set_ylabel('Price')
+    axes[1].plot(rolling['t'], rolling['volatility'])
+    axes[1].set_ylabel('Volatility')
+    axes[2].plot(rolling['t'], rolling['kurtosis'])
+    axes[2].set_ylabel('Excess kurtosis')
+    axes[3].plot(rolling['t'], rolling['autocorrelation'], label='returns')
+    axes[3].plot(rolling['t'], rolling['abs_autocorrelation'], label='absolute returns')
+    axes[3].set_ylabel('Lag 1 ACF')
+    axes[3].legend()
+    axes[3].set_xlabel('Time (end of a {0}-step window)'.format(window))
+    fig.tight_layout()
+    return fig
+
+
+def show(fig):
+    """
+    Display a figure in the Streamlit app.
+    """
+    import streamlit as st
+
+    st.pyplot(fig)
+
+
+def figure_png(fig, dpi=100):
+    """
+    Render a figure to PNG bytes and close it, so the image can be cached and redisplayed without matplotlib.
+    """
+    import io
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
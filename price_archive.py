@@ -0,0 +1,173 @@
+import json
+import os
+
+import numpy as np
+
+from analysis import batch_kurtosis
+
+
+class PriceArchive:
+    """
+    An on-disk (R x T) matrix of simulated price paths.
+
+    Rows are appended to a raw binary file as runs finish and the matrix is
+    read back as a read-only memory map, so statistics can be recomputed on
+    slices of very large replica sets without re-simulating and without
+    loading the archive into memory. A small JSON header records the length
+    and dtype of the paths, and a JSON-lines sidecar the parameters/seed of
+    every row, so an append only writes its own rows.
+
+    Attributes:
+    ----------
+    path : str
+        Path of the binary data file; the header lives in path + '.json' and
+        the row descriptions in path + '.rows.jsonl'.
+    n_steps : int
+        Length T of every price path.
+    dtype : numpy.dtype
+        Storage type (float32 halves the size, float64 keeps full precision).
+    """
+
+    def __init__(self, path, n_steps=None, dtype=np.float64):
+        self.path = path
+        self.meta_path = path + '.json'
+        self.rows_path = path + '.rows.jsonl'
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if n_steps is not None and n_steps != meta['n_steps']:
+                raise ValueError("Archive {0} holds paths of length {1}, not {2}".format(path, meta['n_steps'], n_steps))
+            self.n_steps = meta['n_steps']
+            self.dtype = np.dtype(meta['dtype'])
+            if 'rows' in meta:
+                # Archives written before the JSON-lines sidecar keep the rows in the header
+                self._write_rows(meta['rows'], 'w')
+                self._write_meta()
+            self.row_info, consistent = self._read_rows()
+            if not consistent:
+                self._rewrite_rows()
+        else:
+            if n_steps is None:
+                raise ValueError("n_steps is required to create a new archive")
+            self.n_steps = int(n_steps)
+            self.dtype = np.dtype(dtype)
+            self.row_info = []
+            open(self.path, 'wb').close()
+            open(self.rows_path, 'w').close()
+            self._write_meta()
+
+    @property
+    def row_bytes(self):
+        return self.n_steps * self.dtype.itemsize
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'n_steps': self.n_steps, 'dtype': self.dtype.str}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _write_rows(self, rows, mode='a'):
+        with open(self.rows_path, mode) as f:
+            f.write(''.join(json.dumps(info) + '\n' for info in rows))
+
+    def _read_rows(self):
+        # Returns the committed rows and whether the sidecar holds exactly these rows
+        rows, torn = [], False
+        with open(self.rows_path) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    # The torn last line of an interrupted append was never committed
+                    torn = True
+                    break
+                rows.append(json.loads(line))
+        # Rows are committed after their data, but never trust more rows than the data holds
+        committed = rows[:os.path.getsize(self.path) // self.row_bytes]
+        return committed, not torn and len(committed) == len(rows)
+
+    def __len__(self):
+        return len(self.row_info)
+
+    @property
+    def shape(self):
+        return (len(self), self.n_steps)
+
+    def append(self, prices, info=None):
+        """
+        Append one or several price paths.
+
+        Parameters:
+        ----------
+        prices : array
+            A path of length T or a matrix of shape (r, T).
+        info : dict or list, optional
+            JSON-serializable description (parameters, seed) of every appended row.
+        """
+        prices = np.atleast_2d(np.asarray(prices, dtype=self.dtype))
+        if prices.shape[1] != self.n_steps:
+            raise ValueError("Expected paths of length {0}, got {1}".format(self.n_steps, prices.shape[1]))
+        if info is None or isinstance(info, dict):
+            info = [info] * len(prices)
+        # Data beyond the committed rows is left over from an interrupted append and is overwritten
+        committed = len(self.row_info) * self.row_bytes
+        with open(self.path, 'r+b') as f:
+            f.seek(committed)
+            f.truncate()
+            f.write(np.ascontiguousarray(prices).tobytes())
+        # The rows are committed after their data, so a crash never exposes a partial row
+        self._write_rows(info)
+        self.row_info.extend(info)
+
+    def _rewrite_rows(self):
+        tmp_path = self.rows_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(''.join(json.dumps(info) + '\n' for info in self.row_info))
+        os.replace(tmp_path, self.rows_path)
+
+    def matrix(self):
+        """
+        The archived paths as a read-only memory map of shape (R, T).
+        """
+        if len(self) == 0:
+            return np.empty((0, self.n_steps), dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode='r', shape=self.shape)
+
+    def __getitem__(self, index):
+        return self.matrix()[index]
+
+    def iter_batches(self, batch_size=1024):
+        """
+        Iterate over the archive in row blocks (views into the memory map).
+
+        Yields:
+        ------
+        tuple
+            The index of the first row and a (batch, T) array.
+        """
+        matrix = self.matrix()
+        for start in range(0, len(matrix), batch_size):
+            yield start, matrix[start:start + batch_size]
+
+    def apply(self, statistic, batch_size=1024):
+        """
+        Evaluate a statistic on every archived path.
+
+        Parameters:
+        ----------
+        statistic : callable
+            Function mapping a (batch, T) array of prices to one value per row.
+        batch_size : int
+            Number of rows passed to the statistic at once.
+
+        Returns:
+        -------
+        array
+            The statistic of every row.
+        """
+        return np.concatenate([np.asarray(statistic(np.asarray(batch, dtype=float))) for _, batch in self.iter_batches(batch_size)] or [np.array([])])
+
+
+def kurtosis_of_rows(prices):
+    """
+    Excess kurtosis of the returns of every row of a price matrix.
+    """
+    return batch_kurtosis(prices)
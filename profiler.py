@@ -0,0 +1,111 @@
+"""
+Per-phase profiling of the simulation loop.
+
+Every tick of the market (Market.step) runs the five phases of
+simulate_network.PHASES. Passing a PhaseProfiler to Experiment.run_simulation
+makes it the timer of Market.step, so it times the phases of the same tick
+the unprofiled runs execute, and counts strategy switches and demands that
+were set to zero because volatility exceeded the trader's risk tolerance.
+Without a profiler the tick calls the phases directly, so profiling costs
+nothing when disabled.
+
+    profiler = PhaseProfiler()
+    experiment.run_simulation(profiler=profiler)
+    print(profiler.summary())
+
+or from the command line:
+
+    python profiler.py --traders 1000 --network-type small_world --time-steps 300
+"""
+
+import argparse
+import time
+
+from simulate_network import PHASES
+
+
+class PhaseProfiler:
+    """
+    Accumulates wall time and call counts per phase of the simulation loop.
+
+    Attributes:
+    ----------
+    seconds : dict
+        Total wall time per phase.
+    calls : dict
+        Number of calls per phase (agent-level phases count one call per agent).
+    counters : dict
+        'steps', 'strategy_switches', 'demands' and 'gated_zero_demands'.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.counters = {'steps': 0, 'strategy_switches': 0, 'demands': 0, 'gated_zero_demands': 0}
+
+    def __call__(self, phase, method, t):
+        """
+        Run one phase of a tick (the timer protocol of Market.step) and add its wall time.
+        """
+        start = time.perf_counter()
+        method(t)
+        self.seconds[phase] += time.perf_counter() - start
+
+    def count_step(self, market, t):
+        """
+        Count the calls and events of tick t after Market.step has run it.
+        """
+        traders = market.network.trader_dictionary.values()
+        for phase in PHASES:
+            # Agent-level phases count one call per agent
+            self.calls[phase] += len(traders) if phase in ('update_performance', 'update_wealth') else 1
+        self.counters['steps'] += 1
+        self.counters['strategy_switches'] += len(market.switches)
+        self.counters['demands'] += len(traders)
+        # Gated traders append the integer 0 instead of a drawn demand
+        self.counters['gated_zero_demands'] += sum(1 for agent in traders if agent.D[t] == 0)
+
+    def as_dict(self):
+        """
+        The measurements as a JSON-serializable dict.
+        """
+        return {
+            'phases': {phase: {'seconds': self.seconds[phase], 'calls': self.calls[phase]} for phase in PHASES},
+            'counters': dict(self.counters),
+        }
+
+    def summary(self):
+        """
+        The measurements as a text table, with each phase's share of the loop time.
+        """
+        total = sum(self.seconds.values())
+        steps = max(self.counters['steps'], 1)
+        lines = ["{0:<20} {1:>10} {2:>10} {3:>12} {4:>7}".format('phase', 'calls', 'total s', 'ms per step', 'share')]
+        for phase in PHASES:
+            lines.append("{0:<20} {1:>10} {2:>10.3f} {3:>12.3f} {4:>6.1f}%".format(
+                phase, self.calls[phase], self.seconds[phase], 1000 * self.seconds[phase] / steps,
+                100 * self.seconds[phase] / total if total else 0))
+        demands = max(self.counters['demands'], 1)
+        lines.append("")
+        lines.append("steps: {0}, strategy switches: {1} ({2:.2f} per step), gated zero demands: {3} ({4:.1%} of demands)".format(
+            self.counters['steps'], self.counters['strategy_switches'], self.counters['strategy_switches'] / steps,
+            self.counters['gated_zero_demands'], self.counters['gated_zero_demands'] / demands))
+        return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    from Experiment import Experiment
+
+    parser = argparse.ArgumentParser(description='Profile the phases of the simulation loop.')
+    parser.add_argument('--traders', type=int, default=150)
+    parser.add_argument('--network-type', default='barabasi')
+    parser.add_argument('--new-node-edges', type=int, default=5)
+    parser.add_argument('--time-steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    experiment = Experiment(initial_price=0, time_steps=args.time_steps, network_type=args.network_type, number_of_traders=args.traders,
+                            new_node_edges=args.new_node_edges, seed=args.seed)
+    profiler = PhaseProfiler()
+    experiment.run_simulation(profiler=profiler)
+    print(profiler.summary())
@@ -0,0 +1,162 @@
+"""
+Seed-and-config replay log.
+
+Instead of storing trajectories, every run is recorded by a manifest of a
+few hundred bytes: the engine version, all Experiment parameters, the seed
+and a digest of the resulting prices. replay() regenerates the run exactly
+and can materialize agent-level detail for a requested time window.
+
+    market, manifest = record_run(experiment)
+    save_manifest(manifest, 'runs.jsonl')
+    ...
+    market, detail = replay(load_manifests('runs.jsonl')[0], window=(100, 150))
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+from Experiment import Experiment
+from simulate_network import ENGINE_VERSION
+
+
+def prices_digest(prices):
+    """
+    SHA-256 of a price series, used to verify that a replay is exact.
+    """
+    return hashlib.sha256(np.asarray(prices, dtype=np.float64).tobytes()).hexdigest()
+
+
+def make_manifest(experiment, prices=None):
+    """
+    Build the manifest of a seeded experiment.
+
+    Parameters:
+    ----------
+    experiment : Experiment
+        A seeded experiment.
+    prices : list, optional
+        The prices of the run, stored as a digest for verification.
+
+    Returns:
+    -------
+    dict
+        JSON-serializable manifest.
+    """
+    if experiment.seed is None:
+        raise ValueError("Only seeded experiments can be replayed; use record_run to assign a seed")
+    params = {name: value.item() if isinstance(value, np.generic) else value for name, value in experiment.get_params().items()}
+    manifest = {
+        'engine_version': ENGINE_VERSION,
+        'params': params,
+        'seed': params['seed'],
+        # The per-trader noise streams are spawned from this SeedSequence
+        'seed_sequence': {'entropy': np.random.SeedSequence(params['seed']).entropy, 'spawn_key': []},
+    }
+    if prices is not None:
+        manifest['prices_sha256'] = prices_digest(prices)
+    return manifest
+
+
+def record_run(experiment):
+    """
+    Run an experiment and return its market together with its manifest.
+
+    Unseeded experiments get a fresh random seed first, so every recorded run can be replayed.
+
+    Parameters:
+    ----------
+    experiment : Experiment
+        The experiment to run.
+
+    Returns:
+    -------
+    tuple
+        The market and the manifest of the run.
+    """
+    if experiment.seed is None:
+        experiment.seed = int(np.random.SeedSequence().generate_state(1)[0])
+    market = experiment.run_simulation()
+    return market, make_manifest(experiment, market.prices)
+
+
+def save_manifest(manifest, path):
+    """
+    Append a manifest to a JSON lines file.
+    """
+    with open(path, 'a') as f:
+        f.write(json.dumps(manifest) + '\n')
+
+
+def load_manifests(path):
+    """
+    Read all manifests of a JSON lines file.
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class _WindowRecorder:
+    """
+    Step callback recording agent-level state for the time steps in [start, stop).
+    """
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+        self.time = []
+        self.type = []
+        self.demand = []
+        self.wealth = []
+        self.performance = []
+
+    def __call__(self, t, market):
+        if not self.start <= t < self.stop:
+            return
+        agents = [market.network.trader_dictionary[node] for node in sorted(market.network.trader_dictionary)]
+        self.time.append(t)
+        self.type.append([agent.type for agent in agents])
+        self.demand.append([agent.D[t] for agent in agents])
+        self.wealth.append([agent.W[t] for agent in agents])
+        self.performance.append([agent.G[t] for agent in agents])
+
+    def result(self):
+        return {
+            'time': np.array(self.time, dtype=int),
+            'type': np.array(self.type, dtype=str),
+            'demand': np.array(self.demand, dtype=float),
+            'wealth': np.array(self.wealth, dtype=float),
+            'performance': np.array(self.performance, dtype=float),
+        }
+
+
+def replay(manifest, window=None, verify=True):
+    """
+    Deterministically regenerate a recorded run.
+
+    Parameters:
+    ----------
+    manifest : dict
+        The manifest of the run.
+    window : tuple, optional
+        Time steps (start, stop) for which agent-level detail is materialized.
+    verify : bool
+        Whether to check the regenerated prices against the recorded digest.
+
+    Returns:
+    -------
+    tuple
+        The market and, if a window was requested, a dict of (steps x agents)
+        arrays 'type', 'demand', 'wealth' and 'performance' plus 'time'.
+    """
+    if manifest['engine_version'] != ENGINE_VERSION:
+        raise ValueError("The run was recorded with engine version {0}, but this is version {1}".format(manifest['engine_version'], ENGINE_VERSION))
+    experiment = Experiment(**manifest['params'])
+    recorder = _WindowRecorder(*window) if window is not None else None
+    market = experiment.run_simulation(step_callback=recorder)
+    if verify and 'prices_sha256' in manifest and prices_digest(market.prices) != manifest['prices_sha256']:
+        raise RuntimeError("The replayed prices differ from the recorded run")
+    if recorder is None:
+        return market, None
+    return market, recorder.result()
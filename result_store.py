@@ -0,0 +1,392 @@
+"""
+Columnar store for experiment results.
+
+Experiment parameters and scalar results are stored as typed columns and
+variable-length arrays (drop magnitudes, price paths) as flat value buffers
+with offsets. Every call to ResultStore.append writes a new, immutable part,
+so parallel workers can append to the same store without coordination.
+Parts are Parquet files when pyarrow is installed and otherwise directories
+of .npy files. The .npy parts are read back memory-mapped, without copying
+the arrays; Parquet files are memory-mapped too, but decoding their columns
+copies the data.
+
+Convert the legacy CSV results with
+
+    python result_store.py Data/crash_results_risk.csv Data/crash_results_risk
+"""
+
+import ast
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import numpy as np
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class RaggedColumn:
+    """
+    A column of variable-length float arrays stored as value buffers and offsets.
+
+    Indexing returns views into the (memory-mapped) value buffers.
+
+    Attributes:
+    ----------
+    chunks : list
+        Tuples (values, offsets), one per store part.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.counts = np.cumsum([0] + [len(offsets) - 1 for _, offsets in chunks])
+
+    def __len__(self):
+        return int(self.counts[-1])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        chunk = np.searchsorted(self.counts, index, side='right') - 1
+        values, offsets = self.chunks[chunk]
+        row = index - self.counts[chunk]
+        return values[offsets[row]:offsets[row + 1]]
+
+    def __iter__(self):
+        for values, offsets in self.chunks:
+            for row in range(len(offsets) - 1):
+                yield values[offsets[row]:offsets[row + 1]]
+
+    def lengths(self):
+        """
+        Length of every array in the column.
+        """
+        return np.concatenate([np.diff(offsets) for _, offsets in self.chunks]) if self.chunks else np.array([], dtype=np.int64)
+
+    def values(self):
+        """
+        All array elements concatenated (copies only when the store has several parts).
+        """
+        if len(self.chunks) == 1:
+            values, offsets = self.chunks[0]
+            return values[offsets[0]:offsets[-1]]
+        return np.concatenate([values[offsets[0]:offsets[-1]] for values, offsets in self.chunks])
+
+
+def _column_kind(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return 'array'
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    if isinstance(value, str):
+        return 'str'
+    raise TypeError("Unsupported column value {0!r}".format(value))
+
+
+def _infer_schema(records):
+    """
+    Kind of every column ('array', 'bool', 'int', 'float' or 'str'); ints mixed with floats become floats.
+    """
+    schema = {}
+    for record in records:
+        for name, value in record.items():
+            if value is None:
+                schema.setdefault(name, None)
+                continue
+            kind = _column_kind(value)
+            if schema.get(name) in (None, kind):
+                schema[name] = kind
+            elif {schema[name], kind} == {'int', 'float'}:
+                schema[name] = 'float'
+            else:
+                raise TypeError("Column {0!r} mixes {1} and {2} values".format(name, schema[name], kind))
+    # Columns that are always missing are stored as floats (NaN)
+    return {name: kind or 'float' for name, kind in schema.items()}
+
+
+def _build_columns(records, schema):
+    """
+    Typed NumPy columns from a list of records; arrays become (values, offsets).
+    """
+    columns = {}
+    for name, kind in schema.items():
+        values = [record.get(name) for record in records]
+        if kind == 'array':
+            arrays = [np.asarray(value if value is not None else [], dtype=float).ravel() for value in values]
+            offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(array) for array in arrays])
+            flat = np.concatenate(arrays) if arrays else np.array([], dtype=float)
+            columns[name] = (flat, offsets)
+        elif kind == 'float':
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=float)
+        elif kind == 'int':
+            if any(value is None for value in values):
+                raise ValueError("Integer column {0!r} has missing values".format(name))
+            columns[name] = np.array(values, dtype=np.int64)
+        elif kind == 'bool':
+            columns[name] = np.array([bool(value) for value in values], dtype=bool)
+        else:
+            columns[name] = np.array(['' if value is None else value for value in values], dtype=str)
+    return columns
+
+
+class ResultStore:
+    """
+    An append-only columnar store of experiment results.
+
+    Attributes:
+    ----------
+    path : str
+        Directory of the store.
+    backend : str
+        'parquet' (requires pyarrow) or 'npy'; defaults to parquet when available.
+    """
+
+    def __init__(self, path, backend=None):
+        self.path = path
+        if backend is None:
+            backend = 'parquet' if _has_pyarrow() else 'npy'
+        if backend not in ('parquet', 'npy'):
+            raise ValueError("Unknown backend {0!r}".format(backend))
+        self.backend = backend
+        os.makedirs(path, exist_ok=True)
+
+    def _parts(self):
+        # Part names start with a timestamp, so sorting keeps the append order
+        return sorted(name for name in os.listdir(self.path) if name.startswith('part-'))
+
+    def append(self, records):
+        """
+        Append records to the store as a new part.
+
+        Parameters:
+        ----------
+        records : dict or list
+            One record or a list of records, each a mapping of column names to
+            scalars (parameters, results) or sequences (variable-length arrays).
+
+        Returns:
+        -------
+        str
+            The name of the written part.
+        """
+        if isinstance(records, dict):
+            records = [records]
+        if not records:
+            return None
+        schema = _infer_schema(records)
+        columns = _build_columns(records, schema)
+        name = 'part-{0:020d}-{1}-{2}'.format(time.time_ns(), os.getpid(), uuid.uuid4().hex[:8])
+        tmp_path = os.path.join(self.path, '.tmp-' + name)
+        if self.backend == 'parquet':
+            self._write_parquet(tmp_path, columns, schema)
+            os.replace(tmp_path, os.path.join(self.path, name + '.parquet'))
+            return name + '.parquet'
+        self._write_npy(tmp_path, columns, schema)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        return name
+
+    def _write_parquet(self, path, columns, schema):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = {}
+        for name, kind in schema.items():
+            if kind == 'array':
+                values, offsets = columns[name]
+                arrays[name] = pa.LargeListArray.from_arrays(pa.array(offsets), pa.array(values))
+            else:
+                arrays[name] = pa.array(columns[name])
+        pq.write_table(pa.table(arrays), path)
+
+    def _write_npy(self, path, columns, schema):
+        os.makedirs(path)
+        rows = None
+        for name, kind in schema.items():
+            file_name = _file_name(name)
+            if kind == 'array':
+                values, offsets = columns[name]
+                np.save(os.path.join(path, file_name + '.values.npy'), values)
+                np.save(os.path.join(path, file_name + '.offsets.npy'), offsets)
+                rows = len(offsets) - 1
+            else:
+                np.save(os.path.join(path, file_name + '.npy'), columns[name])
+                rows = len(columns[name])
+        with open(os.path.join(path, 'schema.json'), 'w') as f:
+            json.dump({'columns': schema, 'files': {name: _file_name(name) for name in schema}, 'rows': rows}, f)
+
+    def _read_part(self, part, columns):
+        """
+        Number of rows of one part and its columns as NumPy arrays (scalars) and (values, offsets) tuples (arrays).
+
+        Requested columns the part does not have are skipped; the row count
+        comes from the part's metadata, so it is known even if none of the
+        requested columns is present.
+        """
+        path = os.path.join(self.path, part)
+        result = {}
+        if part.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(path, memory_map=True)
+            available = parquet_file.schema_arrow.names
+            table = parquet_file.read(columns=available if columns is None else [name for name in columns if name in available])
+            for name in table.column_names:
+                column = table.column(name).combine_chunks()
+                if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+                    offsets = column.offsets.to_numpy()
+                    result[name] = (column.values.to_numpy(zero_copy_only=False), offsets)
+                else:
+                    result[name] = column.to_numpy(zero_copy_only=False)
+            return parquet_file.metadata.num_rows, result
+
+        with open(os.path.join(path, 'schema.json')) as f:
+            meta = json.load(f)
+        for name, kind in meta['columns'].items():
+            if columns is not None and name not in columns:
+                continue
+            file_name = os.path.join(path, meta['files'][name])
+            if kind == 'array':
+                result[name] = (np.load(file_name + '.values.npy', mmap_mode='r'), np.load(file_name + '.offsets.npy', mmap_mode='r'))
+            else:
+                result[name] = np.load(file_name + '.npy', mmap_mode='r')
+        rows = meta.get('rows')
+        if rows is None:
+            # Parts written before the row count was recorded: every column has all the rows
+            name, kind = next(iter(meta['columns'].items()))
+            file_name = os.path.join(path, meta['files'][name])
+            rows = len(np.load(file_name + '.offsets.npy', mmap_mode='r')) - 1 if kind == 'array' else len(np.load(file_name + '.npy', mmap_mode='r'))
+        return rows, result
+
+    def read(self, columns=None):
+        """
+        Read the store.
+
+        Parameters:
+        ----------
+        columns : list, optional
+            Columns to read (default: all).
+
+        Returns:
+        -------
+        dict
+            Scalar columns as NumPy arrays and array columns as RaggedColumn.
+            Where a column is missing from some parts, float columns are
+            filled with NaN, array columns with empty arrays, and other
+            columns (integers, booleans, strings) are returned as masked
+            arrays with the missing rows masked, keeping their dtype.
+        """
+        counts, parts = list(zip(*[self._read_part(part, columns) for part in self._parts()])) or ((), ())
+        names = []
+        for part in parts:
+            names += [name for name in part if name not in names]
+        result = {}
+        for name in names:
+            present = [part[name] for part in parts if name in part]
+            if isinstance(present[0], tuple):
+                chunks = []
+                for rows, part in zip(counts, parts):
+                    chunks.append(part[name] if name in part else (np.array([], dtype=float), np.zeros(rows + 1, dtype=np.int64)))
+                result[name] = RaggedColumn(chunks)
+            elif len(parts) == 1:
+                result[name] = present[0]
+            elif len(present) == len(parts):
+                result[name] = np.concatenate(present)
+            else:
+                result[name] = _fill_missing(name, parts, counts)
+        return result
+
+    def to_dataframe(self, columns=None):
+        """
+        Read the store as a pandas DataFrame; array columns hold array views.
+        """
+        import pandas as pd
+
+        data = self.read(columns)
+        return pd.DataFrame({name: list(value) if isinstance(value, RaggedColumn) else value for name, value in data.items()})
+
+    def clear(self):
+        """
+        Remove every part of the store.
+        """
+        for part in self._parts():
+            path = os.path.join(self.path, part)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def _fill_missing(name, parts, counts):
+    # Concatenates a column that only some parts have, without changing its type
+    dtype = np.result_type(*[part[name] for part in parts if name in part])
+    if dtype.kind in 'fc':
+        return np.concatenate([part[name] if name in part else np.full(rows, np.nan, dtype=dtype) for rows, part in zip(counts, parts)])
+    data = np.concatenate([part[name] if name in part else np.zeros(rows, dtype=dtype) for rows, part in zip(counts, parts)])
+    mask = np.concatenate([np.full(rows, name not in part) for rows, part in zip(counts, parts)])
+    return np.ma.MaskedArray(data, mask=mask)
+
+
+def _file_name(column):
+    # Column names such as 'No. of crashes' are made safe for file names
+    return ''.join(char if char.isalnum() or char in '-_' else '_' for char in column)
+
+
+def import_legacy_csv(csv_path, store, array_columns=('Drop magnitude list',)):
+    """
+    Convert a CSV with stringified lists (as in Data/) into a result store.
+
+    Index columns ('Unnamed: ...' and unnamed columns) are dropped and the
+    list columns are parsed once with ast.literal_eval.
+
+    Parameters:
+    ----------
+    csv_path : str
+        Path of the CSV file.
+    store : ResultStore
+        The store the rows are appended to.
+    array_columns : tuple
+        Names of the columns holding stringified lists.
+
+    Returns:
+    -------
+    int
+        Number of imported rows.
+    """
+    import pandas as pd
+
+    frame = pd.read_csv(csv_path)
+    frame = frame.loc[:, [not str(name).startswith('Unnamed') and str(name).strip() != '' for name in frame.columns]]
+    records = []
+    for row in frame.to_dict('records'):
+        for name in array_columns:
+            if name in row:
+                value = row[name]
+                row[name] = ast.literal_eval(value) if isinstance(value, str) and value.strip() else []
+        records.append({name: (None if isinstance(value, float) and np.isnan(value) else value) for name, value in row.items()})
+    store.append(records)
+    return len(records)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python result_store.py <results.csv> <store directory>")
+        sys.exit(1)
+    n_rows = import_legacy_csv(sys.argv[1], ResultStore(sys.argv[2]))
+    print("Imported {0} rows into {1}".format(n_rows, sys.argv[2]))
@@ -1,15 +1,17 @@
-import math
+import copy
 import numpy as np
-import matplotlib.pyplot as plt
-import statsmodels.api as sm
-from scipy.stats import kurtosis, norm
-from statsmodels.graphics.tsaplots import plot_acf
 
 from Fundamentalist import Fundamentalist
 from Chartist import Chartist
 from Network import Network
 from utils import progress_bar, clear_progress_bar
 
+# Version of the simulation dynamics; bump it whenever a change alters simulated prices
+ENGINE_VERSION = '2'
+
+# Phases of one time step of the market, in the order Market.step runs them
+PHASES = ('update_performance', 'update_wealth', 'update_strategies', 'calculate_demands', 'update_price')
+
 class Market:
     """
     A class representing the market environment.
@@ -30,6 +32,8 @@ class Market:
         A list to store the calculated A values.
     average_demand : float
         The average demand in the market.
+    switches : list
+        Node numbers of the agents that switched strategy in the last time step.
     """
     def __init__(self, network, mu, prices, beta, alpha_w, alpha_O, alpha_p):
         self.network = network
@@ -41,6 +45,7 @@ class Market:
         self.alpha_p = alpha_p
         self.A = [0, 0]
         self.average_demand = 0  # Total demand in the market
+        self.switches = []
         
     def calculate_A(self, t):
         """
@@ -55,6 +60,53 @@ class Market:
                       self.alpha_O + 
                       self.alpha_p * (self.fundamentalist.pstar - self.prices[t])**2)
 
+    def step(self, t, timer=None):
+        """
+        Run time step t: every phase of PHASES in order.
+
+        Parameters:
+        ----------
+        t : int
+            The current time step.
+        timer : callable, optional
+            Called as timer(phase, method, t) instead of method(t) for every
+            phase, e.g. to time the phases (see profiler.py).
+        """
+        if timer is None:
+            self.update_performance(t)
+            self.update_wealth(t)
+            self.update_strategies(t)
+            self.calculate_demands(t)
+            self.update_price(t)
+        else:
+            for phase in PHASES:
+                timer(phase, getattr(self, phase), t)
+
+    def update_performance(self, t):
+        """
+        Update the performance of all agents from the last price change.
+
+        Parameters:
+        ----------
+        t : int
+            The current time step.
+        """
+        prices = self.prices
+        for agent in self.network.trader_dictionary.values():
+            agent.update_performance(prices, t)
+
+    def update_wealth(self, t):
+        """
+        Update the wealth of all agents; every agent's wealth only depends on its own performance.
+
+        Parameters:
+        ----------
+        t : int
+            The current time step.
+        """
+        for agent in self.network.trader_dictionary.values():
+            agent.update_wealth(t)
+
     def update_strategies(self, t):
         """
         Update strategies for all agents based on their performance.
@@ -64,6 +116,7 @@ class Market:
         t : int
             The current time step.
         """
+        self.switches = []
         for agent in self.network.trader_dictionary.values():
             agent_node_number = agent.node_number
             agent_W = agent.W
@@ -77,13 +130,17 @@ class Market:
             
             performances = [self.calculate_average_performance(neighbor, agent_lookback_period) for neighbor in neighbors]
             if self.calculate_average_performance(agent, agent_lookback_period) < np.max(performances):
-                self.network.trader_dictionary[agent_node_number] = neighbors[np.argmax(performances)]
+                # Adopt a copy of the best neighbor's strategy; the neighbor itself is left untouched
+                self.network.trader_dictionary[agent_node_number] = copy.copy(neighbors[np.argmax(performances)])
                 self.network.trader_dictionary[agent_node_number].node_number = agent_node_number
                 self.network.trader_dictionary[agent_node_number].W = agent_W 
                 self.network.trader_dictionary[agent_node_number].G = agent_G
                 self.network.trader_dictionary[agent_node_number].D = agent_D
                 self.network.trader_dictionary[agent_node_number].lookback_period = agent_lookback_period
                 self.network.trader_dictionary[agent_node_number].max_risk = agent_max_risk
+                self.network.trader_dictionary[agent_node_number].rng = agent.rng
+                self.network.trader_dictionary[agent_node_number].noise_sign = agent.noise_sign
+                self.switches.append(agent_node_number)
 
     def calculate_average_performance(self, agent, agent_lookback_period):
         """
@@ -134,7 +191,7 @@ class Market:
         new_price = self.prices[t] + self.mu * self.average_demand
         self.prices.append(new_price)
 
-def run_simulation(initial_price, time_steps):
+def run_simulation(initial_price, time_steps, display=False):
     """
     Run the market simulation.
     
@@ -144,6 +201,8 @@ def run_simulation(initial_price, time_steps):
         The initial price of the market.
     time_steps : int
         The number of time steps to simulate.
+    display : bool
+        Whether to show the network at the end of the run (off for batch use).
     
     Returns:
     -------
@@ -156,21 +215,12 @@ def run_simulation(initial_price, time_steps):
     market = Market(network, mu=0.03, prices=prices, beta=1, alpha_w=2668, alpha_O=2.1, alpha_p=0)
 
     for t in range(2, time_steps):
-        for agent in network.trader_dictionary.values():
-            agent.update_performance(market.prices, t)
-            agent.update_wealth(t)
-        
-        # Update strategies for all agents
-        market.update_strategies(t)
-        # Calculate the demands of all agents
-        market.calculate_demands(t)
-        # Update price
-        market.update_price(t)
-
+        market.step(t)
         progress_bar(t / time_steps) 
 
     clear_progress_bar()
     
-    network.display_network()
+    if display:
+        network.display_network(show=True)
 
     return market
@@ -1,7 +1,76 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import plotting
+from background import BackgroundRun
+from downsample import for_display
 from Experiment import Experiment
+from cache import ResultCache
+
+FIGURES = {
+    'qq': plotting.qq_figure,
+    'histogram': plotting.return_histogram_figure,
+    'squared_returns': plotting.squared_returns_figure,
+    'acf': plotting.acf_figure,
+    'ohlc': plotting.ohlc_figure,
+    'rolling': plotting.rolling_figure,
+}
+
+# Line charts are downsampled to this many points, so multi-million-step runs stay responsive
+MAX_CHART_POINTS = 2000
+
+
+def price_chart_data(prices):
+    """
+    Price path reduced with LTTB to at most MAX_CHART_POINTS points, indexed by day.
+    """
+    days, values = for_display(prices, MAX_CHART_POINTS)
+    return pd.DataFrame({'Price': values}, index=pd.Index(days, name='Day'))
+
+
+# Results are memoized by the parameter tuple (which includes the seed), so
+# widget interactions and revisited parameter sets never re-simulate
+@st.cache_data(max_entries=32, show_spinner='Simulating...')
+def simulate(params):
+    """
+    Prices of the run with the given ((name, value), ...) parameters.
+    """
+    return Experiment(**dict(params), cache=ResultCache()).simulate_prices()
+
+
+@st.cache_data(max_entries=32)
+def analyze(params):
+    """
+    Kurtosis, volatility clustering, autocorrelation and crash analysis of one simulated run.
+    """
+    experiment = Experiment(**dict(params))
+    prices = simulate(params)
+    clustering, arch_p_value = experiment.analyze_volatility_clustering(prices)
+    crash, drop_magnitude = experiment.crash_experiment(prices)
+    return {
+        'kurtosis': experiment.fat_tail_experiment(experiment.time_steps, prices),
+        'clustering': clustering,
+        'arch_p_value': arch_p_value,
+        'ljung_box': experiment.analyze_autocorrelation_of_returns(prices),
+        'crash': crash,
+        'drop_magnitude': drop_magnitude,
+    }
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def figure(name, params):
+    """
+    PNG image of one of the FIGURES for a simulated run.
+    """
+    prices = simulate(params)
+    if name in ('qq', 'histogram'):
+        fig = FIGURES[name](prices, dict(params)['time_steps'])
+    elif name == 'rolling':
+        # Windows of a fifth of the run (at most 250 steps) leave room for several regimes
+        fig = FIGURES[name](prices, window=max(2, min(250, (len(prices) - 1) // 5)))
+    else:
+        fig = FIGURES[name](prices)
+    return plotting.figure_png(fig)
+
 
 # Set up the Streamlit interface
 st.title('Stock Price Simulation Experiment')
@@ -14,9 +83,9 @@ Adjust the parameters and run the simulation to see the results.
 # Sidebar for user inputs
 st.sidebar.header('Simulation Parameters')
 initial_price = st.sidebar.number_input('Initial Price', min_value=0.0, value=0.0)
-time_steps = st.sidebar.number_input('Time Steps', min_value=1, max_value=1000, value=500)
+time_steps = st.sidebar.number_input('Time Steps', min_value=3, value=500, step=100)
 network_type = st.sidebar.selectbox('Network Type', ['barabasi', 'small_world'])
-number_of_traders = st.sidebar.number_input('Number of Traders', min_value=1, max_value=500, value=150)
+number_of_traders = st.sidebar.number_input('Number of Traders', min_value=2, value=150, step=50)
 percent_fund = st.sidebar.slider('Percent Fundamental Traders', min_value=0.0, max_value=1.0, value=0.5)
 percent_chartist = st.sidebar.slider('Percent Chartist Traders', min_value=0.0, max_value=1.0, value=0.5)
 percent_rational = st.sidebar.slider('Percent Rational Traders', min_value=0.0, max_value=1.0, value=0.5)
@@ -28,59 +97,123 @@ low_risk = st.sidebar.slider('Low Risk', min_value=0.0, max_value=1.0, value=0.1
 new_node_edges = st.sidebar.number_input('New Node Edges', min_value=1, max_value=100, value=8)
 connection_probability = st.sidebar.slider('Connection Probability', min_value=0.0, max_value=1.0, value=0.5)
 mu = st.sidebar.number_input('Mu', min_value=0.0, value=0.01)
+seed = st.sidebar.number_input('Seed', min_value=0, value=0, step=1)
+
+st.sidebar.header('Charts')
+price_view = st.sidebar.radio('Price view', ['Line', 'OHLC bars'])
+show_distribution = st.sidebar.checkbox('Return distribution', value=True)
+show_squared_returns = st.sidebar.checkbox('Squared returns', value=True)
+show_acf = st.sidebar.checkbox('Autocorrelation', value=True)
+show_rolling = st.sidebar.checkbox('Rolling statistics', value=False)
 
-# Create an instance of the Experiment class with user inputs
-experiment = Experiment(
-    initial_price=initial_price,
-    time_steps=time_steps,
-    network_type=network_type,
-    number_of_traders=number_of_traders,
-    percent_fund=percent_fund,
-    percent_chartist=percent_chartist,
-    percent_rational=percent_rational,
-    percent_risky=percent_risky,
-    high_lookback=high_lookback,
-    low_lookback=low_lookback,
-    high_risk=high_risk,
-    low_risk=low_risk,
-    new_node_edges=new_node_edges,
-    connection_probability=connection_probability,
-    mu=mu, beta=1, alpha_w=2668, alpha_O=2.1, alpha_p=0
+params = (
+    ('initial_price', initial_price),
+    ('time_steps', int(time_steps)),
+    ('network_type', network_type),
+    ('number_of_traders', int(number_of_traders)),
+    ('percent_fund', percent_fund),
+    ('percent_chartist', percent_chartist),
+    ('percent_rational', percent_rational),
+    ('percent_risky', percent_risky),
+    ('high_lookback', int(high_lookback)),
+    ('low_lookback', int(low_lookback)),
+    ('high_risk', high_risk),
+    ('low_risk', low_risk),
+    ('new_node_edges', int(new_node_edges)),
+    ('connection_probability', connection_probability),
+    ('mu', mu), ('beta', 1), ('alpha_w', 2668), ('alpha_O', 2.1), ('alpha_p', 0),
+    ('seed', int(seed)),
 )
 
-# Button to run the simulation
+
+@st.fragment(run_every=0.5)
+def background_progress():
+    """
+    Live progress of the background simulation; the whole app reruns once it finishes.
+    """
+    run = st.session_state['background']
+    status = run.poll()
+    if status == 'running':
+        st.progress(run.progress, text='Simulating... {0:.0%}'.format(run.progress))
+        st.line_chart(price_chart_data(run.prices))
+        if st.button('Cancel'):
+            run.cancel()
+        return
+    del st.session_state['background']
+    if status == 'done':
+        st.session_state['params'] = tuple(run.params.items())
+    elif status == 'cancelled':
+        st.session_state['message'] = 'The simulation was cancelled.'
+    else:
+        st.session_state['message'] = 'The simulation failed: {0}'.format(run.error)
+    st.rerun()
+
+
+# Button to run the simulation; runs that are not cached yet are simulated in a
+# background process, and the last run stays displayed while charts are toggled
 if st.sidebar.button('Run Simulation'):
-    market = experiment.run_simulation()
-    prices = market.prices
-    df = pd.DataFrame({'Day': range(len(prices)), 'Price': prices})
+    if 'background' in st.session_state:
+        st.session_state.pop('background').terminate()
+    experiment = Experiment(**dict(params), cache=ResultCache())
+    if experiment.cache.get_prices(experiment.cache_key()) is not None:
+        st.session_state['params'] = params
+    else:
+        st.session_state['background'] = BackgroundRun(dict(params))
+
+if 'message' in st.session_state:
+    st.warning(st.session_state.pop('message'))
+
+if 'background' in st.session_state:
+    st.subheader('Simulated Stock Prices')
+    background_progress()
+elif 'params' in st.session_state:
+    run_params = st.session_state['params']
+    if run_params != params:
+        st.info("The parameters changed since the last run; press 'Run Simulation' to update the results.")
+    prices = simulate(run_params)
+    results = analyze(run_params)
 
     # Display results
     st.subheader('Simulated Stock Prices')
-    st.line_chart(df.set_index('Day'))
+    if price_view == 'OHLC bars':
+        st.image(figure('ohlc', run_params))
+    else:
+        st.line_chart(price_chart_data(prices))
 
     # Fat Tail Experiment
     st.subheader('Fat Tail Experiment')
-    kurtosis_value = experiment.fat_tail_experiment(time_steps, prices, True)
-    st.write(f"Kurtosis Value: {kurtosis_value}")
+    if show_distribution:
+        st.image(figure('qq', run_params))
+        st.image(figure('histogram', run_params))
+    st.write(f"Kurtosis Value: {results['kurtosis']}")
 
     # Volatility Clustering Analysis
     st.subheader('Volatility Clustering Analysis')
-    experiment.analyze_volatility_clustering(prices, True)
+    if show_squared_returns:
+        st.image(figure('squared_returns', run_params))
+    st.write(f"ARCH test p value: {results['arch_p_value']}")
 
     # Autocorrelation of Returns Analysis
     st.subheader('Autocorrelation of Returns Analysis')
-    p_value = experiment.analyze_autocorrelation_of_returns(prices)
-    st.write(f"p value: {p_value}")
+    if show_acf:
+        st.image(figure('acf', run_params))
+    st.write(f"p value: {results['ljung_box']}")
+
+    # Rolling-window statistics, to spot regime changes within the run
+    if show_rolling:
+        st.subheader('Rolling Statistics')
+        st.image(figure('rolling', run_params))
 
-    # Crash Experiment
+    # Crash Experiment, on the prices of the run shown above
     st.subheader('Crash Experiment')
-    crash, drop_magnitude = experiment.crash_experiment()
-    st.write(f"Number of Crashes Detected: {crash}")
-    st.write(f"Drop Magnitude: {drop_magnitude}")
+    st.write(f"Number of Crashes Detected: {results['crash']}")
+    st.write(f"Drop Magnitude: {results['drop_magnitude']}")
 
 # Instructions
 st.write("""
 ## Instructions:
 - Use the sliders and input boxes on the left to adjust the simulation parameters.
 - Click the 'Run Simulation' button to run the simulation and display the results.
+- New runs are simulated in the background with a live price chart and can be cancelled.
+- Results are cached per parameter set and seed, so revisiting a parameter set or toggling a chart is instant.
 """)
@@ -0,0 +1,459 @@
+import itertools
+import multiprocessing as mp
+import queue
+
+import numpy as np
+
+from Experiment import Experiment
+
+
+def job_seed(seed, point, replica):
+    """
+    Deterministic seed of one (point, replica) job of a sweep.
+
+    Parameters:
+    ----------
+    seed : int
+        Root seed of the sweep.
+    point : int
+        Index of the sweep point.
+    replica : int
+        Replica index at that point.
+
+    Returns:
+    -------
+    int
+        A 32-bit seed that is independent of the order in which jobs run.
+    """
+    return int(np.random.SeedSequence(seed, spawn_key=(point, replica)).generate_state(1)[0])
+
+
+def _to_python(value):
+    # NumPy scalars (e.g. from np.arange) are converted so networkx and JSON accept them
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def sweep_points(axes):
+    """
+    Cartesian product of the swept axes.
+
+    Parameters:
+    ----------
+    axes : dict
+        Mapping of Experiment parameter names to the values to sweep over.
+
+    Returns:
+    -------
+    list
+        One dict of parameter values per sweep point.
+    """
+    names = list(axes)
+    return [dict(zip(names, [_to_python(value) for value in values])) for values in itertools.product(*axes.values())]
+
+
+def _base_params(base):
+    if isinstance(base, Experiment):
+        return base.get_params()
+    return dict(base)
+
+
+def _run_job(job):
+    """
+    Run one simulation of a sweep and evaluate its statistic.
+    """
+    params, statistic, cache = job
+    experiment = Experiment(**params, cache=cache)
+    if statistic is None:
+        return experiment.simulate_prices()
+    return experiment.statistic(statistic)
+
+
+def _run_indexed_job(indexed_job):
+    index, job = indexed_job
+    return index, _run_job(job)
+
+
+def iter_sweep(base, axes, replications, statistic='kurtosis', n_workers=None, seed=0, common_random_numbers=False, antithetic=False, cache=None,
+               replicas=None):
+    """
+    Run a parameter sweep and yield every job result as soon as it finishes.
+
+    Parameters:
+    ----------
+    base : Experiment or dict
+        The base configuration; swept parameters override it.
+    axes : dict
+        Mapping of Experiment parameter names to the values to sweep over.
+    replications : int
+        Number of replicas per sweep point.
+    statistic : str or callable
+        Name in STATISTICS, or a picklable function (experiment, prices) -> float.
+        None yields the price path of every run instead.
+    n_workers : int, optional
+        Number of worker processes (default: all CPUs; 1 runs in-process).
+    seed : int
+        Root seed; every (point, replica) job gets its own deterministic seed.
+    common_random_numbers : bool
+        Whether replica r uses the same seed, and therefore the same network
+        draw and per-trader noise streams, at every sweep point.
+    antithetic : bool
+        Whether replicas come in pairs (2k, 2k + 1) sharing a seed, the second
+        one running on the sign-flipped noise. replications must then be even.
+        The paired runs are negatively correlated, not exact mirror images:
+        the agents' performance depends on exp(prices), which is not odd in
+        the noise. The pairing therefore mainly helps statistics that are
+        close to odd in the noise (e.g. mean returns) and does little for
+        even ones such as the kurtosis.
+    cache : ResultCache, optional
+        Result cache consulted before simulating (default: the base experiment's cache).
+    replicas : iterable, optional
+        Indices of the replicas to run at every point (default: all
+        replications), e.g. to complete an interrupted sweep; the seeds do not
+        depend on which replicas are run.
+
+    Yields:
+    ------
+    dict
+        The swept parameter values, 'point', 'replica', 'seed' and 'value'
+        (and 'pair' for antithetic sweeps).
+    """
+    if antithetic and replications % 2:
+        raise ValueError("Antithetic sweeps need an even number of replications")
+    base_params = _base_params(base)
+    if cache is None and isinstance(base, Experiment):
+        cache = base.cache
+    points = sweep_points(axes)
+    jobs, rows = [], []
+    for point, values in enumerate(points):
+        for replica in (range(replications) if replicas is None else replicas):
+            stream = replica // 2 if antithetic else replica
+            s = job_seed(seed, 0 if common_random_numbers else point, stream)
+            jobs.append((dict(base_params, **values, seed=s, antithetic=antithetic and replica % 2 == 1), statistic, cache))
+            row = dict(values, point=point, replica=replica, seed=s)
+            if antithetic:
+                row['pair'] = stream
+            rows.append(row)
+
+    if n_workers == 1:
+        for row, job in zip(rows, jobs):
+            yield dict(row, value=_run_job(job))
+        return
+
+    with mp.Pool(n_workers) as pool:
+        # Tag every job with its index so unordered completions can be matched back
+        for index, value in pool.imap_unordered(_run_indexed_job, enumerate(jobs)):
+            yield dict(rows[index], value=value)
+
+
+def summarize(results, axis_names, confidence=0.95):
+    """
+    Mean, confidence interval of the mean and percentile band per sweep point.
+
+    Parameters:
+    ----------
+    results : DataFrame or list
+        Job results as yielded by iter_sweep.
+    axis_names : list
+        Names of the swept parameters.
+    confidence : float
+        Confidence level of the interval of the mean and of the percentile band.
+
+    Returns:
+    -------
+    DataFrame
+        One row per sweep point with the columns n, mean, std, ci_lower,
+        ci_upper (Student-t interval of the mean), pct_lower and pct_upper
+        (percentiles of the replica distribution). For antithetic sweeps the
+        interval of the mean is based on the averages of complete pairs.
+    """
+    import pandas as pd
+    from scipy import stats
+
+    results = pd.DataFrame(results)
+    tail = (1 - confidence) / 2
+    rows = []
+    for values, group in results.groupby(['point'] + list(axis_names), sort=True):
+        y = group['value'].to_numpy(dtype=float)
+        # Antithetic pairs are negatively correlated, so only their averages are independent
+        if 'pair' in group:
+            pairs = group.groupby('pair')['value']
+            samples = pairs.mean()[pairs.size() == 2].to_numpy(dtype=float)
+        else:
+            samples = y
+        m = len(samples)
+        mean = np.mean(samples) if m else np.mean(y)
+        std = np.std(y, ddof=1) if len(y) > 1 else np.nan
+        half_width = stats.t.ppf(1 - tail, m - 1) * np.std(samples, ddof=1) / np.sqrt(m) if m > 1 else np.nan
+        rows.append(dict(zip(['point'] + list(axis_names), values), n=len(y), mean=mean, std=std,
+                         ci_lower=mean - half_width, ci_upper=mean + half_width,
+                         pct_lower=np.percentile(y, 100 * tail), pct_upper=np.percentile(y, 100 * (1 - tail))))
+    return pd.DataFrame(rows)
+
+
+def compare_points(results, axis_names, confidence=0.95):
+    """
+    Differences between consecutive sweep points and the variance reduction achieved.
+
+    With common random numbers, replica r of two points shares its random
+    draws, so the difference is estimated from matched replicas. The
+    variance reduction is var(Y_a) + var(Y_b) over var(Y_a - Y_b): the
+    factor by which independent sampling would need more runs for the same
+    precision of the difference (about 1 without common random numbers).
+    For antithetic sweeps the matched units are the pair averages.
+
+    Parameters:
+    ----------
+    results : DataFrame or list
+        Job results as yielded by iter_sweep.
+    axis_names : list
+        Names of the swept parameters.
+    confidence : float
+        Confidence level of the interval of the difference.
+
+    Returns:
+    -------
+    DataFrame
+        One row per pair of consecutive points with the columns point_a,
+        point_b, n, difference, ci_lower, ci_upper and variance_reduction.
+    """
+    import pandas as pd
+    from scipy import stats
+
+    results = pd.DataFrame(results)
+    unit = 'pair' if 'pair' in results else 'replica'
+    matched = results.groupby(['point', unit])['value'].mean().unstack(unit)
+    tail = (1 - confidence) / 2
+    rows = []
+    for point_a, point_b in zip(matched.index[:-1], matched.index[1:]):
+        both = matched.loc[[point_a, point_b]].dropna(axis=1).to_numpy(dtype=float)
+        n = both.shape[1]
+        difference = both[1] - both[0]
+        var_paired = np.var(difference, ddof=1) if n > 1 else np.nan
+        var_independent = np.var(both[0], ddof=1) + np.var(both[1], ddof=1) if n > 1 else np.nan
+        half_width = stats.t.ppf(1 - tail, n - 1) * np.sqrt(var_paired / n) if n > 1 else np.nan
+        mean = np.mean(difference) if n else np.nan
+        rows.append({'point_a': point_a, 'point_b': point_b, 'n': n, 'difference': mean,
+                     'ci_lower': mean - half_width, 'ci_upper': mean + half_width,
+                     'variance_reduction': var_independent / var_paired if var_paired > 0 else np.nan})
+    return pd.DataFrame(rows)
+
+
+def antithetic_variance_reduction(results):
+    """
+    Variance reduction of antithetic pairs at every sweep point.
+
+    Parameters:
+    ----------
+    results : DataFrame or list
+        Job results of an antithetic sweep.
+
+    Returns:
+    -------
+    Series
+        Per point, var(Y) / 2 over the variance of the pair averages: how many
+        times more runs independent sampling needs for the same precision.
+    """
+    import pandas as pd
+
+    results = pd.DataFrame(results)
+    reduction = {}
+    for point, group in results.groupby('point'):
+        pairs = group.groupby('pair')['value']
+        pair_means = pairs.mean()[pairs.size() == 2]
+        reduction[point] = np.var(group['value'], ddof=1) / 2 / np.var(pair_means, ddof=1)
+    return pd.Series(reduction, name='variance_reduction')
+
+
+def run_sweep(base, axes, replications, statistic='kurtosis', n_workers=None, seed=0, confidence=0.95, on_update=None, update_every=None,
+              common_random_numbers=False, antithetic=False, cache=None):
+    """
+    Run a parameter sweep in parallel and summarize it per sweep point.
+
+    Parameters:
+    ----------
+    base : Experiment or dict
+        The base configuration; swept parameters override it.
+    axes : dict
+        Mapping of Experiment parameter names to the values to sweep over.
+    replications : int
+        Number of replicas per sweep point.
+    statistic : str or callable
+        Name in STATISTICS, or a picklable function (experiment, prices) -> float.
+    n_workers : int, optional
+        Number of worker processes (default: all CPUs; 1 runs in-process).
+    seed : int
+        Root seed of the sweep.
+    confidence : float
+        Confidence level of the intervals.
+    on_update : callable, optional
+        Called as on_update(summary, results) with the partial tables while the sweep runs.
+    update_every : int, optional
+        Number of completed jobs between updates (default: once per sweep point's worth of jobs).
+    common_random_numbers : bool
+        Whether every sweep point shares the seeds of its replicas (see iter_sweep).
+    antithetic : bool
+        Whether replicas are run in antithetic pairs (see iter_sweep).
+    cache : ResultCache, optional
+        Result cache consulted before simulating (default: the base experiment's cache).
+
+    Returns:
+    -------
+    tuple
+        The summary table (see summarize) and the table of all job results.
+        compare_points and antithetic_variance_reduction report the variance
+        reduction achieved by the results.
+    """
+    import pandas as pd
+
+    axis_names = list(axes)
+    update_every = update_every or replications
+    results = []
+    for row in iter_sweep(base, axes, replications, statistic, n_workers, seed, common_random_numbers, antithetic, cache):
+        results.append(row)
+        if on_update is not None and len(results) % update_every == 0:
+            on_update(summarize(results, axis_names, confidence), pd.DataFrame(results))
+
+    results = pd.DataFrame(results).sort_values(['point', 'replica'], ignore_index=True)
+    return summarize(results, axis_names, confidence), results
+
+
+def _half_width(values, confidence):
+    """
+    Half-width of the Student-t confidence interval of the mean.
+    """
+    from scipy import stats
+
+    n = len(values)
+    if n < 2:
+        return np.inf
+    return stats.t.ppf(1 - (1 - confidence) / 2, n - 1) * np.std(values, ddof=1) / np.sqrt(n)
+
+
+def run_adaptive_sweep(base, axes, target_half_width, statistic='kurtosis', min_replications=5, max_replications=200,
+                       n_workers=None, seed=0, confidence=0.95, on_update=None, update_every=None, common_random_numbers=False, cache=None):
+    """
+    Run a parameter sweep that keeps adding replicas to a point until its
+    confidence interval is narrow enough.
+
+    Every point first receives min_replications replicas. Afterwards each free
+    worker is given to the point with the largest shortfall between the number
+    of replicas its current variance requires, (t * std / target)^2, and the
+    replicas it has finished or in flight. Points stop once their half-width
+    is below target_half_width or max_replications is reached, so low-variance
+    points stop early and the work shifts to the noisiest points.
+
+    Parameters:
+    ----------
+    base : Experiment or dict
+        The base configuration; swept parameters override it.
+    axes : dict
+        Mapping of Experiment parameter names to the values to sweep over.
+    target_half_width : float
+        Target half-width of the confidence interval of the mean at every point.
+    statistic : str or callable
+        Name in STATISTICS, or a picklable function (experiment, prices) -> float.
+    min_replications : int
+        Replicas every point receives before its variance is trusted (at least 2).
+    max_replications : int
+        Cap on the replicas of any point.
+    n_workers : int, optional
+        Number of worker processes (default: all CPUs; 1 runs in-process).
+    seed : int
+        Root seed; replica r of point p always gets job_seed(seed, p, r).
+    confidence : float
+        Confidence level of the intervals.
+    on_update : callable, optional
+        Called as on_update(summary, results) with the partial tables while the sweep runs.
+    update_every : int, optional
+        Number of completed jobs between updates (default: once per sweep point).
+    common_random_numbers : bool
+        Whether replica r uses the same seed at every sweep point.
+    cache : ResultCache, optional
+        Result cache consulted before simulating (default: the base experiment's cache).
+
+    Returns:
+    -------
+    tuple
+        The summary table (see summarize, with an extra 'converged' column)
+        and the table of all job results.
+    """
+    import pandas as pd
+    from scipy import stats
+
+    base_params = _base_params(base)
+    if cache is None and isinstance(base, Experiment):
+        cache = base.cache
+    points = sweep_points(axes)
+    axis_names = list(axes)
+    min_replications = max(2, min_replications)
+    update_every = update_every or len(points)
+    t_value = stats.t.ppf(1 - (1 - confidence) / 2, min_replications - 1)
+
+    values = [[] for _ in points]
+    in_flight = [0] * len(points)
+    results = []
+
+    def converged(p):
+        return len(values[p]) >= min_replications and _half_width(values[p], confidence) <= target_half_width
+
+    def next_point():
+        # Warm-up: every point needs min_replications before its variance is estimated
+        shortfall = np.full(len(points), -np.inf)
+        for p in range(len(points)):
+            submitted = len(values[p]) + in_flight[p]
+            if submitted >= max_replications or converged(p):
+                continue
+            if submitted < min_replications:
+                shortfall[p] = np.inf
+            elif len(values[p]) >= min_replications:
+                required = (t_value * np.std(values[p], ddof=1) / target_half_width)**2
+                shortfall[p] = min(required, max_replications) - submitted
+        p = int(np.argmax(shortfall))
+        return p if shortfall[p] > 0 else None
+
+    def make_job(p):
+        replica = len(values[p]) + in_flight[p]
+        in_flight[p] += 1
+        s = job_seed(seed, 0 if common_random_numbers else p, replica)
+        return dict(points[p], point=p, replica=replica, seed=s), (dict(base_params, **points[p], seed=s), statistic, cache)
+
+    def record(row, value):
+        in_flight[row['point']] -= 1
+        values[row['point']].append(value)
+        results.append(dict(row, value=value))
+        if on_update is not None and len(results) % update_every == 0:
+            on_update(summarize(results, axis_names, confidence), pd.DataFrame(results))
+
+    if n_workers == 1:
+        p = next_point()
+        while p is not None:
+            row, job = make_job(p)
+            record(row, _run_job(job))
+            p = next_point()
+    else:
+        done = queue.Queue()
+        capacity = n_workers or mp.cpu_count()
+        with mp.Pool(capacity) as pool:
+            running = 0
+            while True:
+                # Keep every worker busy with the point that needs replicas most
+                while running < capacity:
+                    p = next_point()
+                    if p is None:
+                        break
+                    row, job = make_job(p)
+                    pool.apply_async(_run_job, (job,), callback=lambda value, row=row: done.put((row, value, None)),
+                                     error_callback=lambda error, row=row: done.put((row, None, error)))
+                    running += 1
+                if running == 0:
+                    break
+                row, value, error = done.get()
+                running -= 1
+                if error is not None:
+                    raise error
+                record(row, value)
+
+    results = pd.DataFrame(results).sort_values(['point', 'replica'], ignore_index=True)
+    summary = summarize(results, axis_names, confidence)
+    summary['converged'] = [converged(p) for p in summary['point']]
+    return summary, results
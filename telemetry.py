@@ -0,0 +1,315 @@
+"""
+Live throughput telemetry for parallel campaigns.
+
+Every worker (or chunk of work) publishes its progress through a
+WorkerMetrics object: completed samples, simulated steps per second and the
+time of its last update. The metrics are written as small JSON files to a
+shared directory, so no server is needed in the workers. A
+TelemetryAggregator in the coordinating process reads them, computes the
+overall throughput and ETA, and flags stalled workers and stragglers. It
+can export the aggregate in Prometheus text format, to a file or on a
+localhost HTTP endpoint:
+
+    # worker
+    metrics = WorkerMetrics('metrics', total=len(chunk))
+    for params in chunk:
+        metrics.sample_started()
+        value = experiment.statistic('kurtosis', step_callback=metrics)
+        metrics.sample_finished()
+
+    # coordinator
+    aggregator = TelemetryAggregator('metrics', total=n_samples)
+    aggregator.serve(9100)  # http://127.0.0.1:9100/metrics
+    follow(pool.map_async(model, chunks), aggregator)
+"""
+
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+
+
+class WorkerMetrics:
+    """
+    Progress of one worker, published as JSON to a metrics directory.
+
+    Used as a step callback, it counts the simulated time steps.
+
+    Attributes:
+    ----------
+    directory : str
+        Shared metrics directory.
+    total : int
+        Number of samples assigned to the worker.
+    interval : float
+        Minimum number of seconds between writes triggered by time steps.
+    """
+
+    def __init__(self, directory, total, interval=1.0):
+        self.directory = directory
+        self.total = total
+        self.interval = interval
+        # Pool processes can run several chunks, so every chunk publishes under its own name
+        self.name = 'worker-{0}-{1}'.format(os.getpid(), uuid.uuid4().hex[:8])
+        self.path = os.path.join(directory, self.name + '.json')
+        os.makedirs(directory, exist_ok=True)
+        self.started = time.time()
+        self.samples_done = 0
+        self.steps = 0
+        self.steps_per_second = 0.0
+        self.in_sample = False
+        self._window_start = time.monotonic()
+        self._window_steps = 0
+        self._last_write = 0
+        self.publish()
+
+    def __call__(self, t, market):
+        self.steps += 1
+        self._window_steps += 1
+        if time.monotonic() - self._last_write >= self.interval:
+            self.publish()
+
+    def sample_started(self):
+        self.in_sample = True
+        self.publish()
+
+    def sample_finished(self):
+        self.in_sample = False
+        self.samples_done += 1
+        self.publish()
+
+    def publish(self):
+        """
+        Write the current state atomically to the metrics directory.
+        """
+        now = time.monotonic()
+        if now - self._window_start >= self.interval:
+            self.steps_per_second = self._window_steps / (now - self._window_start)
+            self._window_start = now
+            self._window_steps = 0
+        self._last_write = now
+        state = {
+            'worker': self.name,
+            'pid': os.getpid(),
+            'started': self.started,
+            'updated': time.time(),
+            'samples_done': self.samples_done,
+            'samples_total': self.total,
+            'steps': self.steps,
+            'steps_per_second': self.steps_per_second,
+            'in_sample': self.in_sample,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+class TelemetryAggregator:
+    """
+    Aggregates the metrics published by the workers of a campaign.
+
+    Attributes:
+    ----------
+    directory : str
+        Shared metrics directory.
+    total : int, optional
+        Total number of samples of the campaign (default: the sum over the workers).
+    stall_seconds : float
+        A worker that has not published for this long while unfinished is stalled.
+    straggler_factor : float
+        An active worker whose step rate is below this fraction of the median rate is a straggler.
+    """
+
+    def __init__(self, directory, total=None, stall_seconds=60, straggler_factor=0.5):
+        self.directory = directory
+        self.total = total
+        self.stall_seconds = stall_seconds
+        self.straggler_factor = straggler_factor
+        self.created = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def reset(self):
+        """
+        Remove the metrics of a previous campaign.
+        """
+        for name in os.listdir(self.directory):
+            if name.startswith('worker-'):
+                os.remove(os.path.join(self.directory, name))
+        self.created = time.time()
+
+    def workers(self):
+        """
+        The latest published state of every worker.
+        """
+        states = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith('worker-') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                # The file was replaced while it was read; it is picked up on the next poll
+                continue
+        return states
+
+    def summary(self):
+        """
+        Aggregate progress of the campaign.
+
+        Returns:
+        -------
+        dict
+            'completed', 'total', 'samples_per_second', 'steps_per_second',
+            'eta_seconds', 'active' (number of unfinished workers) and the
+            names of the 'stalled' workers and 'stragglers', plus the
+            per-worker states under 'workers'.
+        """
+        now = time.time()
+        workers = self.workers()
+        completed = sum(worker['samples_done'] for worker in workers)
+        total = self.total if self.total is not None else sum(worker['samples_total'] for worker in workers)
+        start = min([worker['started'] for worker in workers] + [self.created])
+        elapsed = max(now - start, 1e-9)
+        samples_per_second = completed / elapsed
+        active = [worker for worker in workers if worker['samples_done'] < worker['samples_total']]
+        stalled = [worker['worker'] for worker in active if now - worker['updated'] > self.stall_seconds]
+        # Only workers that are simulating have a meaningful step rate (cached samples take no steps)
+        running = [worker for worker in active if worker['in_sample'] and worker['worker'] not in stalled]
+        rates = [worker['steps_per_second'] for worker in running]
+        stragglers = []
+        if len(rates) >= 2:
+            median = statistics.median(rates)
+            stragglers = [worker['worker'] for worker in running if worker['steps_per_second'] < self.straggler_factor * median]
+        return {
+            'completed': completed,
+            'total': total,
+            'samples_per_second': samples_per_second,
+            'steps_per_second': sum(rates),
+            'eta_seconds': (total - completed) / samples_per_second if samples_per_second > 0 else None,
+            'active': len(active),
+            'stalled': stalled,
+            'stragglers': stragglers,
+            'workers': workers,
+        }
+
+    def status_line(self, summary=None):
+        """
+        One-line description of the aggregate progress.
+        """
+        summary = summary or self.summary()
+        eta = summary['eta_seconds']
+        line = "{0}/{1} samples, {2:.0f} steps/s, ETA {3}".format(
+            summary['completed'], summary['total'], summary['steps_per_second'], '-' if eta is None else '{0:.0f} s'.format(eta))
+        if summary['stalled']:
+            line += ", stalled: " + ', '.join(summary['stalled'])
+        if summary['stragglers']:
+            line += ", stragglers: " + ', '.join(summary['stragglers'])
+        return line
+
+    def prometheus_text(self, summary=None):
+        """
+        The aggregate and per-worker metrics in Prometheus text exposition format.
+        """
+        summary = summary or self.summary()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP abm_{0} {1}'.format(name, help_text))
+            lines.append('# TYPE abm_{0} {1}'.format(name, kind))
+            for labels, value in samples:
+                label_text = '{' + ','.join('{0}="{1}"'.format(key, val) for key, val in labels.items()) + '}' if labels else ''
+                lines.append('abm_{0}{1} {2}'.format(name, label_text, value))
+
+        workers = summary['workers']
+        metric('samples_completed_total', 'counter', 'Completed samples.', [({}, summary['completed'])])
+        metric('samples', 'gauge', 'Samples in the campaign.', [({}, summary['total'])])
+        metric('samples_per_second', 'gauge', 'Completed samples per second since the start.', [({}, summary['samples_per_second'])])
+        metric('steps_per_second', 'gauge', 'Simulated time steps per second of the active workers.', [({}, summary['steps_per_second'])])
+        metric('eta_seconds', 'gauge', 'Estimated seconds until the campaign completes.', [({}, summary['eta_seconds'] if summary['eta_seconds'] is not None else 'NaN')])
+        metric('worker_samples_completed_total', 'counter', 'Completed samples per worker.', [({'worker': w['worker']}, w['samples_done']) for w in workers])
+        metric('worker_steps_per_second', 'gauge', 'Simulated time steps per second per worker.', [({'worker': w['worker']}, w['steps_per_second']) for w in workers])
+        metric('worker_last_update_seconds', 'gauge', 'Unix time of the last update per worker.', [({'worker': w['worker']}, w['updated']) for w in workers])
+        metric('worker_stalled', 'gauge', 'Whether the worker stopped publishing while unfinished.', [({'worker': w['worker']}, int(w['worker'] in summary['stalled'])) for w in workers])
+        metric('worker_straggler', 'gauge', 'Whether the worker is much slower than the median worker.', [({'worker': w['worker']}, int(w['worker'] in summary['stragglers'])) for w in workers])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=None):
+        """
+        Write the metrics in Prometheus text format to a file (default: metrics.prom in the metrics directory).
+        """
+        path = path or os.path.join(self.directory, 'metrics.prom')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def serve(self, port=9100, host='127.0.0.1'):
+        """
+        Serve the metrics on http://host:port/metrics from a background thread.
+
+        Returns:
+        -------
+        ThreadingHTTPServer
+            The server; call shutdown() to stop it.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        aggregator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = aggregator.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def follow(async_result, aggregator, interval=2.0):
+    """
+    Show live progress of a pool job until it completes and return its result.
+
+    Parameters:
+    ----------
+    async_result : AsyncResult
+        Result of pool.map_async (or apply_async) for workers publishing to the aggregator's directory.
+    aggregator : TelemetryAggregator
+        Aggregator of the campaign; its Prometheus file is refreshed on every poll.
+    interval : float
+        Seconds between polls.
+
+    Returns:
+    -------
+    The result of the job.
+    """
+    from tqdm import tqdm
+
+    summary = aggregator.summary()
+    with tqdm(total=summary['total']) as bar:
+        while True:
+            finished = async_result.ready()
+            summary = aggregator.summary()
+            bar.n = summary['completed']
+            bar.set_postfix_str(aggregator.status_line(summary), refresh=False)
+            bar.refresh()
+            aggregator.write_prometheus()
+            if finished:
+                break
+            async_result.wait(interval)
+    return async_result.get()
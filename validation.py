@@ -0,0 +1,203 @@
+"""
+Statistical equivalence of simulation engines.
+
+A new engine has to reproduce the behavior of the reference object-based
+engine. compare_engines runs both on the same configuration and checks
+
+- bitwise equality of the prices of seeded runs (matched seeds), which only
+  holds if the candidate consumes the random streams exactly like the
+  reference;
+- the distributions of the return kurtosis, the ARCH p-value and the
+  Ljung-Box statistic (two-sample Kolmogorov-Smirnov tests), the
+  time-averaged and final fraction of chartists (KS tests) and the crash
+  rate (Fisher's exact test) over independent replicas of each engine.
+
+The distribution tests use disjoint seeds for the two engines, so the
+samples are independent, and a Bonferroni correction over all tests.
+
+    python validation.py --candidate object --replicas 40
+"""
+
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+import analysis
+from engines import ENGINES, get_engine
+from sweep import job_seed
+
+SCALAR_STATISTICS = ('kurtosis', 'arch_p_value', 'ljung_box_stat', 'mean_chartist_fraction', 'final_chartist_fraction')
+
+
+class _TypeFractions:
+    """
+    Step callback recording the fraction of chartists after every time step.
+    """
+
+    def __init__(self):
+        self.fractions = []
+
+    def __call__(self, t, market):
+        agents = market.network.trader_dictionary.values()
+        self.fractions.append(sum(agent.type == 'Chartist' for agent in agents) / len(agents))
+
+
+def run_replica(job):
+    """
+    Run one replica of an engine and compute its validation statistics.
+
+    Parameters:
+    ----------
+    job : tuple
+        Engine name, Experiment parameters and seed.
+
+    Returns:
+    -------
+    dict
+        The prices, the scalar statistics and the chartist fraction trajectory.
+    """
+    from Experiment import Experiment
+
+    engine, params, seed = job
+    recorder = _TypeFractions()
+    prices = np.asarray(get_engine(engine)(Experiment(**dict(params, seed=seed)), step_callback=recorder), dtype=float)
+    fractions = np.array(recorder.fractions)
+    return {
+        'prices': prices,
+        'kurtosis': analysis.return_kurtosis(prices),
+        'arch_p_value': analysis.arch_test(prices)[1],
+        'ljung_box_stat': float(analysis.ljung_box(prices, lags=[20])['lb_stat'].iloc[0]),
+        'crash': analysis.detect_crash(prices)[0],
+        'chartist_fraction': fractions,
+        'mean_chartist_fraction': fractions.mean(),
+        'final_chartist_fraction': fractions[-1],
+    }
+
+
+def run_replicas(engine, params, seeds, n_workers=1):
+    """
+    Run an engine for every seed.
+
+    Returns:
+    -------
+    list
+        The result of run_replica for every seed, in order.
+    """
+    jobs = [(engine, params, seed) for seed in seeds]
+    if n_workers == 1:
+        return [run_replica(job) for job in jobs]
+    with mp.Pool(n_workers) as pool:
+        return pool.map(run_replica, jobs)
+
+
+def compare_engines(params, reference='object', candidate='object', n_replicas=30, n_bitwise=3, seed=0, alpha=0.01, n_workers=1):
+    """
+    Test whether a candidate engine is statistically equivalent to the reference engine.
+
+    Parameters:
+    ----------
+    params : dict
+        Experiment parameters (without the seed).
+    reference, candidate : str
+        Names of the engines in engines.ENGINES.
+    n_replicas : int
+        Independent replicas per engine for the distribution tests.
+    n_bitwise : int
+        Seeded runs compared bit for bit.
+    seed : int
+        Root seed; replica r of the reference uses job_seed(seed, 0, r), of the candidate job_seed(seed, 1, r).
+    alpha : float
+        Family-wise significance level of the distribution tests.
+    n_workers : int
+        Number of worker processes.
+
+    Returns:
+    -------
+    dict
+        'bitwise_identical' (number of matched seeded runs with identical
+        prices) and 'bitwise_runs', 'tests' (per statistic: test name,
+        statistic, p-value, reference and candidate means), 'max_fraction_gap'
+        (largest difference of the mean chartist fraction trajectories),
+        'threshold' (Bonferroni-corrected level) and 'equivalent'.
+    """
+    from scipy import stats
+
+    params = {name: value for name, value in params.items() if name != 'seed'}
+
+    # Matched seeds: identical prices show that the candidate reproduces the reference exactly
+    bitwise_seeds = [job_seed(seed, 2, r) for r in range(n_bitwise)]
+    bitwise_reference = run_replicas(reference, params, bitwise_seeds, n_workers)
+    bitwise_candidate = run_replicas(candidate, params, bitwise_seeds, n_workers)
+    identical = sum(np.array_equal(a['prices'], b['prices']) for a, b in zip(bitwise_reference, bitwise_candidate))
+
+    # Disjoint seeds: independent samples for the two-sample tests
+    reference_runs = run_replicas(reference, params, [job_seed(seed, 0, r) for r in range(n_replicas)], n_workers)
+    candidate_runs = run_replicas(candidate, params, [job_seed(seed, 1, r) for r in range(n_replicas)], n_workers)
+
+    tests = {}
+    for name in SCALAR_STATISTICS:
+        a = np.array([run[name] for run in reference_runs])
+        b = np.array([run[name] for run in candidate_runs])
+        result = stats.ks_2samp(a, b)
+        tests[name] = {'test': 'ks_2samp', 'statistic': float(result.statistic), 'p_value': float(result.pvalue),
+                       'reference_mean': float(a.mean()), 'candidate_mean': float(b.mean())}
+    crashes_a = sum(run['crash'] for run in reference_runs)
+    crashes_b = sum(run['crash'] for run in candidate_runs)
+    odds_ratio, p_value = stats.fisher_exact([[crashes_a, n_replicas - crashes_a], [crashes_b, n_replicas - crashes_b]])
+    tests['crash_rate'] = {'test': 'fisher_exact', 'statistic': float(odds_ratio), 'p_value': float(p_value),
+                           'reference_mean': crashes_a / n_replicas, 'candidate_mean': crashes_b / n_replicas}
+
+    length = min(min(len(run['chartist_fraction']) for run in runs) for runs in (reference_runs, candidate_runs))
+    mean_a = np.mean([run['chartist_fraction'][:length] for run in reference_runs], axis=0)
+    mean_b = np.mean([run['chartist_fraction'][:length] for run in candidate_runs], axis=0)
+
+    threshold = alpha / len(tests)
+    return {
+        'reference': reference,
+        'candidate': candidate,
+        'bitwise_runs': n_bitwise,
+        'bitwise_identical': int(identical),
+        'tests': tests,
+        'max_fraction_gap': float(np.max(np.abs(mean_a - mean_b))) if length else 0.0,
+        'threshold': threshold,
+        'equivalent': all(test['p_value'] >= threshold for test in tests.values()),
+    }
+
+
+def report(result):
+    """
+    Text report of a compare_engines result.
+    """
+    lines = ["{0} vs {1}: {2}/{3} seeded runs bitwise identical".format(
+        result['reference'], result['candidate'], result['bitwise_identical'], result['bitwise_runs'])]
+    lines.append("{0:<24} {1:<13} {2:>10} {3:>10} {4:>12} {5:>12}".format('statistic', 'test', 'stat', 'p-value', 'reference', 'candidate'))
+    for name, test in result['tests'].items():
+        lines.append("{0:<24} {1:<13} {2:>10.4f} {3:>10.4f} {4:>12.4f} {5:>12.4f}{6}".format(
+            name, test['test'], test['statistic'], test['p_value'], test['reference_mean'], test['candidate_mean'],
+            '  DIFFERENT' if test['p_value'] < result['threshold'] else ''))
+    lines.append("largest gap of the mean chartist fraction trajectories: {0:.4f}".format(result['max_fraction_gap']))
+    lines.append("equivalent at family-wise level (Bonferroni threshold {0:.4f}): {1}".format(result['threshold'], 'yes' if result['equivalent'] else 'no'))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Test a simulation engine for statistical equivalence with the reference engine.')
+    parser.add_argument('--reference', default='object', choices=sorted(ENGINES))
+    parser.add_argument('--candidate', default='object', choices=sorted(ENGINES))
+    parser.add_argument('--replicas', type=int, default=30)
+    parser.add_argument('--bitwise', type=int, default=3)
+    parser.add_argument('--traders', type=int, default=100)
+    parser.add_argument('--network-type', default='barabasi')
+    parser.add_argument('--new-node-edges', type=int, default=4)
+    parser.add_argument('--time-steps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--alpha', type=float, default=0.01)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    params = {'initial_price': 0, 'time_steps': args.time_steps, 'network_type': args.network_type, 'number_of_traders': args.traders,
+              'new_node_edges': args.new_node_edges}
+    result = compare_engines(params, args.reference, args.candidate, args.replicas, args.bitwise, args.seed, args.alpha, args.workers)
+    print(report(result))
+    raise SystemExit(0 if result['equivalent'] and (args.reference != args.candidate or result['bitwise_identical'] == result['bitwise_runs']) else 1)